@@ -1,18 +1,32 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
+import asyncio
+import threading
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
+import hashlib
 import os
-import schemas, database, models
+import time
+import schemas, database, models, cache
 
 # openssl rand -hex 32
 SECRET_KEY = os.environ.get("SECRET_KEY", "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Verified tokens and user snapshots, so authenticated requests skip the users lookup.
+# A token entry maps to a user id; the user's snapshot is a separate entry that
+# update_user, password resets and avatar uploads delete via invalidate_user.
+user_cache = cache.create_backend(
+    os.environ.get("AUTH_CACHE_URL"),
+    max_entries=int(os.environ.get("AUTH_CACHE_SIZE", "4096")),
+    ttl=float(os.environ.get("AUTH_CACHE_TTL", "30")),
+)
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -22,6 +36,61 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+# bcrypt takes ~250ms of CPU per call. Async endpoints run it on a dedicated, bounded
+# pool instead of the event loop; PASSWORD_HASH_WORKERS=0 runs it inline.
+PASSWORD_HASH_QUEUE_LIMIT = int(os.environ.get("PASSWORD_HASH_QUEUE_LIMIT", "64"))
+_hash_pool = None
+_hash_workers = 0
+_hash_pending = 0
+_hash_rejected = 0
+_hash_lock = threading.Lock()
+
+def set_password_hash_workers(workers: int):
+    global _hash_pool, _hash_workers
+    _hash_workers = max(workers, 0)
+    previous, _hash_pool = _hash_pool, (
+        ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash") if workers > 0 else None
+    )
+    if previous is not None:
+        previous.shutdown(wait=False)
+
+set_password_hash_workers(int(os.environ.get("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1)))))
+
+async def _run_password_hashing(function, *args):
+    global _hash_pending, _hash_rejected
+    pool = _hash_pool
+    if pool is None:
+        return function(*args)
+    with _hash_lock:
+        if _hash_pending >= PASSWORD_HASH_QUEUE_LIMIT:
+            _hash_rejected += 1
+            # Shed load rather than queue logins for longer than clients will wait
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many password checks in progress, please retry",
+                headers={"Retry-After": "1"},
+            )
+        _hash_pending += 1
+    try:
+        return await asyncio.wrap_future(pool.submit(function, *args))
+    finally:
+        with _hash_lock:
+            _hash_pending -= 1
+
+async def verify_password_async(plain_password, hashed_password):
+    return await _run_password_hashing(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await _run_password_hashing(get_password_hash, password)
+
+def password_hash_stats() -> dict:
+    return {
+        "workers": _hash_workers,
+        "pending": _hash_pending,
+        "queue_limit": PASSWORD_HASH_QUEUE_LIMIT,
+        "rejected": _hash_rejected,
+    }
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -32,21 +101,86 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+def _token_key(token: str) -> str:
+    return "auth_token:" + hashlib.sha256(token.encode()).hexdigest()
+
+def _user_key(user_id: int) -> str:
+    return f"auth_user:{user_id}"
+
+def invalidate_user(user_id: int):
+    user_cache.delete(_user_key(user_id))
+
+def _lookup_user(db: Session, token: str):
+    """Decode the token and load its user; returns (user, token expiry) or (None, None)."""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
-            raise credentials_exception
+            return None, None
         token_data = schemas.TokenData(email=email)
     except JWTError:
-        raise credentials_exception
+        return None, None
     user = db.query(models.User).filter(models.User.email == token_data.email).first()
+    return user, payload.get("exp")
+
+def _snapshot(user: models.User) -> dict:
+    return schemas.User.model_validate(user).dict()
+
+def resolve_user(db: Session, token: str) -> Optional[schemas.User]:
+    """The active user a bearer token belongs to, or None if the token is missing, invalid, expired or the user inactive."""
+    if not token:
+        return None
+    token_key = _token_key(token)
+    entry = user_cache.get(token_key)
+    if entry is not cache.MISSING:
+        if entry["expires_at"] <= time.time():
+            user_cache.delete(token_key)
+            return None
+        started = time.monotonic()
+        snapshot = user_cache.get(_user_key(entry["user_id"]))
+        if snapshot is cache.MISSING:
+            # Invalidated or expired: reload by id, and recheck the email the token was issued for
+            user = db.get(models.User, entry["user_id"])
+            if user is None or user.email != entry["email"]:
+                user_cache.delete(token_key)
+                return None
+            snapshot = _snapshot(user)
+            user_cache.set(_user_key(user.id), snapshot, computed_since=started)
+        if snapshot["email"] != entry["email"] or not snapshot["is_active"]:
+            return None
+        return schemas.User(**snapshot)
+
+    started = time.monotonic()
+    user, expires_at = _lookup_user(db, token)
+    if user is None or not user.is_active:
+        return None
+    snapshot = _snapshot(user)
+    # Never cache a token past its own expiry
+    ttl = min(user_cache.ttl, expires_at - time.time()) if expires_at else user_cache.ttl
+    if ttl >= 1:
+        user_cache.set(token_key, {"user_id": user.id, "email": user.email, "expires_at": expires_at or time.time() + ttl}, ttl=ttl)
+        user_cache.set(_user_key(user.id), snapshot, computed_since=started)
+    return schemas.User(**snapshot)
+
+# Plain def: FastAPI runs it in the threadpool, so a cache miss (a DB query, or Redis I/O
+# with AUTH_CACHE_URL) never blocks the event loop of the async routes that depend on it
+# The user snapshot is cached, so it is always loaded from the primary: a lagging replica
+# could keep a deactivated user or a changed password authenticating for the cache TTL
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_primary_db)):
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    user = resolve_user(db, token)
     if user is None:
         raise credentials_exception
     return user
+
+def user_from_token(token: str) -> Optional[schemas.User]:
+    """resolve_user with a short-lived session, for callers outside a request (WebSocket handshakes)."""
+    db = database.SessionLocal()
+    try:
+        return resolve_user(db, token)
+    finally:
+        db.close()
@@ -0,0 +1,29 @@
+"""
+Rebuild the task_daily_rollups table from the tasks table.
+
+Run this once after upgrading an existing database (SQLite or Postgres), or at any
+time to repair the analytics buckets:
+
+    python backfill_rollups.py            # all users
+    python backfill_rollups.py 42         # a single user id
+"""
+import sys
+
+import models, rollups
+from database import SessionLocal, engine
+
+
+def backfill(user_id=None):
+    models.Base.metadata.create_all(bind=engine, tables=[models.TaskDailyRollup.__table__])
+    db = SessionLocal()
+    try:
+        rollups.backfill(db, user_id=user_id)
+        db.commit()
+        buckets = db.query(models.TaskDailyRollup).count()
+        print(f"Backfill complete! {buckets} rollup buckets in task_daily_rollups.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    backfill(int(sys.argv[1]) if len(sys.argv) > 1 else None)
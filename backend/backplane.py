@@ -0,0 +1,248 @@
+"""
+Cross-worker pub/sub for WebSocket events.
+
+Each worker process only holds its own sockets, so an event published on one worker
+has to be relayed to the others. notify_clients delivers to local sockets directly
+and hands the event to the backplane, which relays it to every other worker; events
+carry the publishing process's ORIGIN so a worker ignores its own echoes.
+
+Backends (REALTIME_BACKPLANE):
+- local     single process, nothing is relayed (default)
+- postgres  LISTEN/NOTIFY; payloads over the NOTIFY size limit go through realtime_events
+- polling   workers insert into and poll the realtime_events table (SQLite dev/tests)
+
+Publishing never blocks the request: events are queued and written by a background
+thread, and listeners run in their own thread and hand events back to the event loop.
+"""
+import json
+import os
+import queue
+import select
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+import database, models
+
+ORIGIN = uuid.uuid4().hex
+
+NOTIFY_CHANNEL = "task_events"
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+MAX_NOTIFY_PAYLOAD = 7900
+POLL_INTERVAL = float(os.environ.get("REALTIME_POLL_INTERVAL", "0.25"))
+EVENT_RETENTION = timedelta(minutes=5)
+RECONNECT_DELAY = 2.0
+
+Event = models.RealtimeEvent
+
+
+class Backplane:
+    """Interface shared by the backplanes. `deliver(channel, message)` runs on the event loop."""
+
+    def __init__(self):
+        self.published = 0
+        self.received = 0
+        self.errors = 0
+
+    def start(self, loop, deliver):
+        pass
+
+    def stop(self):
+        pass
+
+    def publish(self, channel: str, message: str):
+        pass
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self).__name__,
+            "published": self.published,
+            "received": self.received,
+            "errors": self.errors,
+        }
+
+
+class LocalBackplane(Backplane):
+    """Single-process deployments: local sockets already got the event."""
+
+
+class ThreadedBackplane(Backplane):
+    """Publishes from a writer thread and listens from a reader thread."""
+
+    def __init__(self, engine, origin: str = ORIGIN):
+        super().__init__()
+        self.engine = engine
+        self.origin = origin
+        self._outbox = queue.Queue()
+        self._stopping = threading.Event()
+        self._writer = None
+        self._listener = None
+        self._lock = threading.Lock()
+        self._loop = None
+        self._deliver = None
+
+    def start(self, loop, deliver):
+        self._loop, self._deliver = loop, deliver
+        self._stopping.clear()
+        self._ensure_writer()
+        if self._listener is None or not self._listener.is_alive():
+            self._listener = threading.Thread(target=self._listen_forever, name=f"{type(self).__name__}-listener", daemon=True)
+            self._listener.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._outbox.put(None)
+        for thread in (self._writer, self._listener):
+            if thread is not None:
+                thread.join(timeout=5)
+        self._writer = self._listener = None
+
+    def publish(self, channel: str, message: str):
+        self._ensure_writer()
+        self._outbox.put((channel, message))
+
+    def _ensure_writer(self):
+        # Started lazily too, so publishing works before (or without) the startup hook
+        with self._lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_forever, name=f"{type(self).__name__}-writer", daemon=True)
+                self._writer.start()
+
+    def _write_forever(self):
+        while True:
+            item = self._outbox.get()
+            if item is None:
+                return
+            # Write everything that queued up meanwhile in one go
+            batch = [item]
+            while len(batch) < 500:
+                try:
+                    item = self._outbox.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._outbox.put(None)
+                    break
+                batch.append(item)
+            try:
+                self._write(batch)
+                self.published += len(batch)
+            except Exception as e:
+                self.errors += 1
+                print(f"[REALTIME] Could not publish {len(batch)} events: {e}")
+
+    def _listen_forever(self):
+        while not self._stopping.is_set():
+            try:
+                self._listen()
+            except Exception as e:
+                self.errors += 1
+                print(f"[REALTIME] Backplane listener error, reconnecting: {e}")
+                self._stopping.wait(RECONNECT_DELAY)
+
+    def _received(self, origin: str, channel: str, message: str):
+        if origin == self.origin or self._loop is None:
+            return
+        self.received += 1
+        self._loop.call_soon_threadsafe(self._deliver, channel, message)
+
+    def _write(self, batch):
+        raise NotImplementedError
+
+    def _listen(self):
+        raise NotImplementedError
+
+
+class PollingBackplane(ThreadedBackplane):
+    def __init__(self, engine, origin: str = ORIGIN, interval: float = POLL_INTERVAL):
+        super().__init__(engine, origin)
+        self.interval = interval
+
+    def _write(self, batch):
+        now = datetime.utcnow()
+        with self.engine.begin() as conn:
+            conn.execute(Event.__table__.insert(), [
+                {"origin": self.origin, "channel": channel, "message": message, "created_at": now}
+                for channel, message in batch
+            ])
+
+    def _listen(self):
+        with self.engine.connect() as conn:
+            last_id = conn.execute(text("SELECT coalesce(max(id), 0) FROM realtime_events")).scalar()
+            conn.rollback()
+            last_pruned = time.monotonic()
+            while not self._stopping.wait(self.interval):
+                rows = conn.execute(
+                    text("SELECT id, origin, channel, message FROM realtime_events WHERE id > :last ORDER BY id LIMIT 1000"),
+                    {"last": last_id},
+                ).all()
+                conn.rollback()
+                for row in rows:
+                    last_id = row.id
+                    self._received(row.origin, row.channel, row.message)
+                if time.monotonic() - last_pruned > EVENT_RETENTION.total_seconds():
+                    self._prune(conn)
+                    last_pruned = time.monotonic()
+
+    def _prune(self, conn):
+        conn.execute(Event.__table__.delete().where(Event.created_at < datetime.utcnow() - EVENT_RETENTION))
+        conn.commit()
+
+
+class PostgresBackplane(ThreadedBackplane):
+    def __init__(self, engine, origin: str = ORIGIN):
+        super().__init__(engine, origin)
+        self._last_pruned = time.monotonic()
+
+    def _write(self, batch):
+        with self.engine.begin() as conn:
+            for channel, message in batch:
+                payload = json.dumps({"o": self.origin, "c": channel, "m": message})
+                if len(payload.encode()) > MAX_NOTIFY_PAYLOAD:
+                    # Too big for NOTIFY: store it and send a reference
+                    event_id = conn.execute(
+                        Event.__table__.insert().returning(Event.id),
+                        {"origin": self.origin, "channel": channel, "message": message, "created_at": datetime.utcnow()},
+                    ).scalar()
+                    payload = json.dumps({"o": self.origin, "id": event_id})
+                conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": NOTIFY_CHANNEL, "payload": payload})
+            if time.monotonic() - self._last_pruned > EVENT_RETENTION.total_seconds():
+                conn.execute(Event.__table__.delete().where(Event.created_at < datetime.utcnow() - EVENT_RETENTION))
+                self._last_pruned = time.monotonic()
+
+    def _listen(self):
+        with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            connection = conn.connection.driver_connection
+            conn.exec_driver_sql(f"LISTEN {NOTIFY_CHANNEL}")
+            while not self._stopping.is_set():
+                if select.select([connection], [], [], 1.0) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    notify = connection.notifies.pop(0)
+                    event = json.loads(notify.payload)
+                    if event["o"] == self.origin:
+                        continue
+                    if "id" in event:
+                        row = conn.execute(
+                            text("SELECT channel, message FROM realtime_events WHERE id = :id"), {"id": event["id"]}
+                        ).first()
+                        if row is None:
+                            continue
+                        event["c"], event["m"] = row.channel, row.message
+                    self._received(event["o"], event["c"], event["m"])
+
+
+def create_backplane(kind: str = None, engine=None) -> Backplane:
+    engine = engine or database.engine
+    if kind == "postgres":
+        return PostgresBackplane(engine)
+    if kind == "polling":
+        return PollingBackplane(engine)
+    return LocalBackplane()
+
+
+event_backplane = create_backplane(os.environ.get("REALTIME_BACKPLANE", "local"))
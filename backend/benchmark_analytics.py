@@ -0,0 +1,86 @@
+"""
+Benchmark for crud.get_task_stats: SQL statement count and latency per call.
+
+Seeds a single user with N tasks (default 100k) spread over the last 60 days
+and times every analytics period.
+
+Usage:
+    python benchmark_analytics.py                      # temporary SQLite file
+    python benchmark_analytics.py postgresql://u:p@host/db
+    BENCH_TASKS=20000 python benchmark_analytics.py
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+
+import crud, models, rollups
+
+NUM_TASKS = int(os.environ.get("BENCH_TASKS", "100000"))
+ROUNDS = int(os.environ.get("BENCH_ROUNDS", "5"))
+
+
+def seed(session, num_tasks):
+    user = models.User(email=f"bench_{int(time.time())}@example.com", hashed_password="x", full_name="Bench User")
+    session.add(user)
+    session.commit()
+
+    now = datetime.utcnow()
+    statuses = list(models.TaskStatus)
+    priorities = list(models.TaskPriority)
+    rows = []
+    for i in range(num_tasks):
+        rows.append({
+            "title": f"Task {i}",
+            "description": "benchmark task",
+            "status": random.choice(statuses),
+            "priority": random.choice(priorities),
+            "time_spent": round(random.random() * 8, 1),
+            "created_at": now - timedelta(minutes=random.randint(0, 60 * 24 * 60)),
+            "owner_id": user.id,
+        })
+        if len(rows) == 10000:
+            session.execute(insert(models.Task), rows)
+            rows = []
+    if rows:
+        session.execute(insert(models.Task), rows)
+    rollups.backfill(session, user_id=user.id)
+    session.commit()
+    return user.id
+
+
+def run(url):
+    engine = create_engine(url)
+    models.Base.metadata.create_all(bind=engine)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    print(f"Seeding {NUM_TASKS} tasks into {engine.url.get_backend_name()}...")
+    user_id = seed(session, NUM_TASKS)
+
+    print(f"{'period':<8}{'queries':>10}{'median ms':>12}{'max ms':>10}")
+    for period in os.environ.get("BENCH_PERIODS", "day,week,month").split(","):
+        timings = []
+        for _ in range(ROUNDS):
+            statements.clear()
+            start = time.perf_counter()
+            crud.get_task_stats(session, user_id=user_id, period=period)
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"{period:<8}{len(statements):>10}{statistics.median(timings):>12.1f}{max(timings):>10.1f}")
+    session.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        run(sys.argv[1])
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            run(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
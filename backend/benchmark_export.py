@@ -0,0 +1,83 @@
+"""
+Benchmark the task export formats: generation time and output size.
+
+Seeds one user with N tasks (default 1M) in a temporary SQLite database, or in the
+database given on the command line, then renders every export format end to end.
+
+Usage:
+    python benchmark_export.py
+    BENCH_TASKS=200000 python benchmark_export.py postgresql://u:p@host/db
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+import exports, models
+
+NUM_TASKS = int(os.environ.get("BENCH_TASKS", "1000000"))
+
+
+def seed(session, num_tasks):
+    user = models.User(email=f"export_bench_{int(time.time())}@example.com", hashed_password="x", full_name="Export Bench")
+    session.add(user)
+    session.commit()
+
+    now = datetime.utcnow()
+    statuses = list(models.TaskStatus)
+    priorities = list(models.TaskPriority)
+    rows = []
+    for i in range(num_tasks):
+        rows.append({
+            "title": f"Task number {i} for the quarterly plan",
+            "description": "benchmark task",
+            "status": random.choice(statuses),
+            "priority": random.choice(priorities),
+            "time_spent": round(random.random() * 8, 1),
+            "due_date": now + timedelta(days=random.randint(0, 90)) if i % 3 else None,
+            "created_at": now - timedelta(minutes=random.randint(0, 60 * 24 * 365)),
+            "owner_id": user.id,
+        })
+        if len(rows) == 20000:
+            session.execute(insert(models.Task), rows)
+            rows = []
+    if rows:
+        session.execute(insert(models.Task), rows)
+    session.commit()
+    return user.id
+
+
+def run(url):
+    engine = create_engine(url)
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    print(f"Seeding {NUM_TASKS} tasks into {engine.url.get_backend_name()}...")
+    user_id = seed(session, NUM_TASKS)
+    session.close()
+
+    formats = [("csv", False), ("csv", True), ("ndjson", False), ("ndjson", True)]
+    if exports.parquet_available():
+        formats.append(("parquet", False))
+    print(f"{'format':<12}{'seconds':>10}{'MB':>10}")
+    for export_format, gzipped in formats:
+        start = time.perf_counter()
+        chunks = exports.render(export_format, exports.iter_task_batches(user_id, session_factory=Session))
+        if gzipped:
+            chunks = exports.gzip_chunks(chunks)
+        size = sum(len(chunk.encode() if isinstance(chunk, str) else chunk) for chunk in chunks)
+        label = export_format + (".gz" if gzipped else "")
+        print(f"{label:<12}{time.perf_counter() - start:>10.2f}{size / 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        run(sys.argv[1])
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            run(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
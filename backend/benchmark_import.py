@@ -0,0 +1,62 @@
+"""
+Benchmark bulk_import.import_tasks throughput (rows per second) for CSV and NDJSON.
+
+Usage:
+    python benchmark_import.py                       # temporary SQLite file
+    python benchmark_import.py postgresql://u:p@host/db
+    BENCH_TASKS=500000 BENCH_BATCH=5000 python benchmark_import.py
+"""
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import bulk_import, models, search
+
+NUM_TASKS = int(os.environ.get("BENCH_TASKS", "200000"))
+BATCH_SIZE = int(os.environ.get("BENCH_BATCH", "5000"))
+
+
+def payload(import_format):
+    if import_format == "csv":
+        lines = ["title,description,status,priority,time_spent,due_date"]
+        lines += [f"Task {i},imported task,todo,high,1.5,2030-01-01T00:00:00" for i in range(NUM_TASKS)]
+    else:
+        lines = [json.dumps({"title": f"Task {i}", "description": "imported task", "status": "todo",
+                             "priority": "high", "time_spent": 1.5, "due_date": "2030-01-01T00:00:00"})
+                 for i in range(NUM_TASKS)]
+    return ("\n".join(lines) + "\n").encode()
+
+
+def run(url):
+    engine = create_engine(url)
+    models.Base.metadata.create_all(bind=engine)
+    if os.environ.get("BENCH_FTS", "1") == "1":
+        search.setup(engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    user = models.User(email=f"import_bench_{int(time.time())}@example.com", hashed_password="x", full_name="Import Bench")
+    session.add(user)
+    session.commit()
+
+    print(f"{'format':<10}{'rows':>10}{'seconds':>10}{'rows/s':>12}")
+    for import_format in bulk_import.IMPORT_FORMATS:
+        body = bulk_import.open_text(io.BytesIO(payload(import_format)))
+        start = time.perf_counter()
+        result = bulk_import.import_tasks(session, user.id, body, import_format, batch_size=BATCH_SIZE)
+        elapsed = time.perf_counter() - start
+        print(f"{import_format:<10}{result['imported']:>10}{elapsed:>10.2f}{result['imported'] / elapsed:>12.0f}")
+    session.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        run(sys.argv[1])
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            run(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
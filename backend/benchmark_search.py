@@ -0,0 +1,86 @@
+"""
+Benchmark for full-text task search (GET /tasks/?search=) with many users.
+
+Seeds BENCH_USERS users with BENCH_TASKS_PER_USER tasks each, all drawn from the same
+vocabulary, so a word matches tasks of every user while only one user's are returned.
+Times crud.get_tasks for a common word, a rarer one and a two-word prefix query.
+
+Usage:
+    python benchmark_search.py                      # temporary SQLite file
+    python benchmark_search.py postgresql://u:p@host/db
+    BENCH_USERS=200 BENCH_TASKS_PER_USER=500 python benchmark_search.py
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+import crud, models, search
+
+NUM_USERS = int(os.environ.get("BENCH_USERS", "100"))
+TASKS_PER_USER = int(os.environ.get("BENCH_TASKS_PER_USER", "1000"))
+ROUNDS = int(os.environ.get("BENCH_ROUNDS", "20"))
+
+COMMON = ["report", "review", "update", "meeting", "deploy", "fix", "write", "plan"]
+RARE = ["invoice", "migration", "onboarding", "audit"]
+QUERIES = {"common": "report", "rare": "invoice", "two words": "rev upd"}
+
+
+def seed(session):
+    rng = random.Random(0)
+    stamp = int(time.time())
+    users = [
+        models.User(email=f"search_bench_{stamp}_{i}@example.com", hashed_password="x", full_name=f"Search User {i}")
+        for i in range(NUM_USERS)
+    ]
+    session.add_all(users)
+    session.commit()
+    for user in users:
+        rows = []
+        for i in range(TASKS_PER_USER):
+            words = rng.sample(COMMON, 3) + ([rng.choice(RARE)] if rng.random() < 0.02 else [])
+            rows.append({
+                "title": " ".join(words[:2]).capitalize(),
+                "description": " ".join(words[2:]),
+                "owner_id": user.id,
+            })
+        session.execute(insert(models.Task), rows)
+    session.commit()
+    return [user.id for user in users]
+
+
+def run(url):
+    engine = create_engine(url)
+    models.Base.metadata.create_all(bind=engine)
+    if not search.setup(engine):
+        sys.exit(f"No full-text index on {engine.url.get_backend_name()}")
+
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    print(f"Seeding {NUM_USERS} users x {TASKS_PER_USER} tasks into {engine.url.get_backend_name()}...")
+    user_ids = seed(session)
+    user_id = user_ids[len(user_ids) // 2]
+
+    print(f"{'query':<12}{'results':>9}{'median ms':>12}{'max ms':>10}")
+    for name, term in QUERIES.items():
+        timings = []
+        for _ in range(ROUNDS):
+            start = time.perf_counter()
+            results = crud.get_tasks(session, user_id=user_id, limit=50, search=term, summary=True)
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"{name:<12}{len(results):>9}{statistics.median(timings):>12.1f}{max(timings):>10.1f}")
+    session.close()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        run(sys.argv[1])
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            run(f"sqlite:///{os.path.join(tmp, 'search_bench.db')}")
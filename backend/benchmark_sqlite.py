@@ -0,0 +1,102 @@
+"""
+Benchmark mixed read/write throughput on SQLite: the plain engine (SQLITE_MODE=default,
+the previous behaviour) against the production profile (WAL and tuned pragmas, writes
+serialized by database.WriteSerializer).
+
+Worker threads stand in for the request threadpool. Each operation is a task list read
+(the GET /tasks/ query) or, with probability BENCH_WRITE_RATIO, a task creation (the
+POST /tasks/ write path, with its activity and rollup updates). Failed operations,
+usually "database is locked", are counted rather than retried.
+
+Usage:
+    python benchmark_sqlite.py
+    BENCH_THREADS=16 BENCH_SECONDS=10 BENCH_WRITE_RATIO=0.5 python benchmark_sqlite.py
+"""
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from sqlalchemy.orm import sessionmaker
+
+import crud, database, models, schemas, search
+
+NUM_THREADS = int(os.environ.get("BENCH_THREADS", "8"))
+DURATION = float(os.environ.get("BENCH_SECONDS", "5"))
+WRITE_RATIO = float(os.environ.get("BENCH_WRITE_RATIO", "0.2"))
+SEED_TASKS = int(os.environ.get("BENCH_SEED_TASKS", "2000"))
+
+
+def setup(path, mode):
+    engine = database.create_sqlite_engine(f"sqlite:///{path}", mode=mode, pool_size=NUM_THREADS, max_overflow=0)
+    models.Base.metadata.create_all(bind=engine)
+    search.setup(engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    serializer = None
+    if mode == "production":
+        serializer = database.WriteSerializer()
+        serializer.install(Session)
+    with Session() as db:
+        user = models.User(email="sqlite_bench@example.com", hashed_password="x", full_name="SQLite Bench")
+        db.add(user)
+        db.commit()
+        user_id = user.id
+        for i in range(SEED_TASKS):
+            db.add(models.Task(title=f"Seed task {i}", owner_id=user_id))
+        db.commit()
+    return engine, Session, serializer, user_id
+
+
+def p99(timings):
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+
+
+def run(Session, user_id):
+    reads, writes, errors = [], [], []
+    deadline = time.perf_counter() + DURATION
+
+    def worker(seed):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            write = rng.random() < WRITE_RATIO
+            start = time.perf_counter()
+            try:
+                with Session() as db:
+                    if write:
+                        crud.create_task(db, schemas.TaskCreate(title=f"Bench task {rng.random()}"), user_id)
+                    else:
+                        crud.get_tasks(db, user_id=user_id, limit=50, summary=True)
+            except Exception as e:
+                errors.append(type(e).__name__)
+                continue
+            (writes if write else reads).append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(NUM_THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return reads, writes, errors
+
+
+def main():
+    print(f"{NUM_THREADS} threads for {DURATION:.0f}s, {WRITE_RATIO:.0%} writes, {SEED_TASKS} seeded tasks")
+    print(f"{'mode':<12}{'ops/s':>8}{'reads/s':>9}{'writes/s':>10}{'read p99':>10}{'write p50':>11}{'write p99':>11}{'errors':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("default", "production"):
+            engine, Session, serializer, user_id = setup(os.path.join(tmp, f"{mode}.db"), mode)
+            reads, writes, errors = run(Session, user_id)
+            engine.dispose()
+            print(f"{mode:<12}{(len(reads) + len(writes)) / DURATION:>8.0f}{len(reads) / DURATION:>9.0f}{len(writes) / DURATION:>10.0f}"
+                  f"{p99(reads) if reads else 0:>10.1f}{statistics.median(writes) if writes else 0:>11.1f}"
+                  f"{p99(writes) if writes else 0:>11.1f}{len(errors):>8}")
+            if serializer is not None:
+                print(f"{'':<12}writer lock: {serializer.stats()}")
+    print("(latencies in ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark WebSocket fan-out.
+
+Simulates N connections (default 10k) spread over users with a few tabs each, using
+in-memory sockets so only the manager's own cost is measured, and reports the time
+a request spends publishing one event:
+
+- broadcast to all: the previous behaviour, awaiting send_text on every open socket
+- per-user channel: enqueueing for the owner's sockets only
+- ... with a slow tab: the same, with one of the owner's tabs taking 50 ms per send,
+  once awaited in turn (previous behaviour) and once through the send queues
+
+Usage:
+    python benchmark_websocket.py
+    BENCH_CONNECTIONS=50000 BENCH_TABS=2 python benchmark_websocket.py
+"""
+import asyncio
+import os
+import random
+import statistics
+import time
+
+from realtime import ConnectionManager, user_channel
+
+NUM_CONNECTIONS = int(os.environ.get("BENCH_CONNECTIONS", "10000"))
+TABS_PER_USER = int(os.environ.get("BENCH_TABS", "3"))
+NUM_EVENTS = int(os.environ.get("BENCH_EVENTS", "200"))
+SLOW_SEND_SECONDS = 0.05
+
+
+class FakeWebSocket:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.received = 0
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.received += 1
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+async def broadcast_all(manager: ConnectionManager, message: str):
+    for websocket in list(manager.connections):
+        await websocket.send_text(message)
+
+
+async def send_sequentially(manager: ConnectionManager, channel: str, message: str):
+    for connection in list(manager.channels.get(channel, ())):
+        await connection.websocket.send_text(message)
+
+
+async def measure(publish, num_users, events=NUM_EVENTS):
+    timings = []
+    for _ in range(events):
+        start = time.perf_counter()
+        result = publish(random.randrange(num_users))
+        if asyncio.iscoroutine(result):
+            await result
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name, timings):
+    timings.sort()
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"{name:<32}{statistics.median(timings):>10.3f}{p99:>10.3f}")
+
+
+async def main():
+    manager = ConnectionManager(queue_size=NUM_EVENTS * 2)
+    num_users = max(1, NUM_CONNECTIONS // TABS_PER_USER)
+    for i in range(NUM_CONNECTIONS):
+        await manager.connect(FakeWebSocket(), [user_channel(i % num_users)])
+    message = '{"type": "TASK_UPDATED", "task": {"id": 1, "status": "done"}}'
+    print(f"{NUM_CONNECTIONS} connections, {num_users} users, {NUM_EVENTS} events")
+    print(f"{'strategy':<32}{'p50 ms':>10}{'p99 ms':>10}")
+
+    report("broadcast to all", await measure(lambda user_id: broadcast_all(manager, message), num_users))
+    report("per-user channel", await measure(lambda user_id: manager.publish(user_channel(user_id), message), num_users))
+    await asyncio.sleep(0.1)
+
+    # One user with a slow tab; every event goes to that user
+    await manager.connect(FakeWebSocket(delay=SLOW_SEND_SECONDS), [user_channel(0)])
+    report("slow tab, awaited in turn", await measure(lambda _: send_sequentially(manager, user_channel(0), message), 1, 20))
+    report("slow tab, send queues", await measure(lambda _: manager.publish(user_channel(0), message), 1))
+    print(f"queue stats: {manager.stats()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
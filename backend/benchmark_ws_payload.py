@@ -0,0 +1,96 @@
+"""
+Benchmark bytes on the wire for TASK_UPDATED WebSocket events: full task payloads
+(the previous behaviour) versus field-level diffs merged by realtime.UpdateCoalescer.
+
+Workload: a kanban user dragging cards between columns. Each burst is one to three
+quick updates to the same card (move it, log time, maybe rename or reprioritize it),
+on tasks that carry a realistic number of comments and attachments.
+
+Usage:
+    python benchmark_ws_payload.py
+    BENCH_BURSTS=1000 BENCH_COMMENTS=20 python benchmark_ws_payload.py
+"""
+import asyncio
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+
+import realtime, schemas
+
+NUM_BURSTS = int(os.environ.get("BENCH_BURSTS", "300"))
+NUM_COMMENTS = int(os.environ.get("BENCH_COMMENTS", "8"))
+NUM_ATTACHMENTS = int(os.environ.get("BENCH_ATTACHMENTS", "2"))
+WINDOW = 0.02
+
+STATUSES = ["todo", "in_progress", "done"]
+
+
+def make_task(task_id: int, owner: schemas.User) -> schemas.Task:
+    now = datetime.utcnow()
+    return schemas.Task(
+        id=task_id,
+        title=f"Prepare the quarterly planning deck #{task_id}",
+        description="Collect numbers from finance, draft the roadmap slides and circulate for review.",
+        status="todo",
+        priority="medium",
+        due_date=now + timedelta(days=7),
+        time_spent=0.0,
+        created_at=now,
+        owner_id=owner.id,
+        owner=owner,
+        comments=[
+            schemas.Comment(id=task_id * 100 + i, content=f"Update {i}: waiting on the revised figures from finance.",
+                            created_at=now, task_id=task_id, author_id=owner.id, author=owner)
+            for i in range(NUM_COMMENTS)
+        ],
+        attachments=[
+            schemas.Attachment(id=task_id * 10 + i, filename=f"draft-{i}.pdf", file_path=f"uploads/{task_id}-{i}.pdf",
+                               uploaded_at=now, task_id=task_id)
+            for i in range(NUM_ATTACHMENTS)
+        ],
+    )
+
+
+def burst():
+    """One to three updates a user makes to a card in quick succession."""
+    updates = [{"status": random.choice(STATUSES)}]
+    if random.random() < 0.6:
+        updates.append({"time_spent": round(random.random() * 4, 1)})
+    if random.random() < 0.3:
+        updates.append(random.choice([{"title": "Renamed card"}, {"priority": random.choice(["low", "high"])}]))
+    return updates
+
+
+async def main():
+    owner = schemas.User(id=1, email="owner@example.com", full_name="Owner", is_active=True)
+    tasks = [make_task(task_id, owner) for task_id in range(1, 51)]
+    sizes = {"full": 0, "diff": 0, "events_full": 0, "events_diff": 0}
+
+    def sink(channel, message):
+        sizes["diff"] += len(message.encode())
+        sizes["events_diff"] += 1
+
+    coalescer = realtime.UpdateCoalescer(sink, window=WINDOW)
+    for _ in range(NUM_BURSTS):
+        task = random.choice(tasks)
+        for changes in burst():
+            task = schemas.Task(**{**dict(task), **changes})
+            sizes["full"] += len(json.dumps({"type": "TASK_UPDATED", "task": jsonable_encoder(task)}).encode())
+            sizes["events_full"] += 1
+            coalescer.update("user:1", task.id, 1, jsonable_encoder(changes))
+        await asyncio.sleep(WINDOW * 1.5)
+    coalescer.flush("user:1")
+
+    print(f"{NUM_BURSTS} bursts, {NUM_COMMENTS} comments and {NUM_ATTACHMENTS} attachments per task")
+    print(f"{'payload':<22}{'events':>8}{'KB':>10}{'bytes/event':>13}")
+    for name, label in (("full", "full task"), ("diff", "coalesced diffs")):
+        events, size = sizes[f"events_{name}"], sizes[name]
+        print(f"{label:<22}{events:>8}{size / 1024:>10.1f}{size / events:>13.0f}")
+    print(f"reduction: {100 * (1 - sizes['diff'] / sizes['full']):.1f}%")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,168 @@
+"""
+Bulk task import from CSV or NDJSON.
+
+Rows are validated one by one against schemas.TaskCreate and inserted in batches with a
+single multi-row INSERT per batch (executemany / insertmanyvalues), followed by one
+rollup and streak update per batch rather than per task. Invalid rows are skipped and
+reported back with their row number.
+
+CSV files use TaskCreate field names as headers; the headers written by /tasks/export
+are accepted too, so an export can be imported again as-is.
+
+A body that can't be read at all past some row (bytes that aren't UTF-8, or CSV
+structure errors such as an unterminated quote) stops the import with ImportAborted:
+batches are committed as they fill, so every valid row before that row is imported and
+nothing from it onwards is. The error carries the row number and the counts so far.
+"""
+import csv
+import json
+import os
+from datetime import datetime
+
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+
+import crud, models, rollups, schemas
+
+# Larger request bodies are rejected with 413
+MAX_BODY_BYTES = int(os.environ.get("IMPORT_MAX_BYTES", str(50 * 1024 * 1024)))
+DEFAULT_BATCH_SIZE = 1000
+MAX_BATCH_SIZE = 10000
+MAX_REPORTED_ERRORS = 100
+
+CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "application/x-jsonlines": "ndjson",
+}
+IMPORT_FORMATS = ("csv", "ndjson")
+
+# /tasks/export column headers -> TaskCreate fields
+CSV_HEADER_ALIASES = {
+    "time spent (hrs)": "time_spent",
+    "due date": "due_date",
+}
+
+
+class ImportAborted(Exception):
+    """Reading the body failed at `row` (0 = the CSV header); `result` covers the rows before it."""
+
+    def __init__(self, row: int, error: Exception):
+        super().__init__(f"Could not read {'the header' if row == 0 else f'row {row}'}: {error}")
+        self.row = row
+        self.error = error
+        self.result = None
+
+
+def detect_format(content_type: str = None, explicit: str = None):
+    if explicit:
+        return explicit if explicit in IMPORT_FORMATS else None
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    return CONTENT_TYPES.get(media_type)
+
+
+def _clean(record: dict) -> dict:
+    return {key: value for key, value in record.items() if value not in (None, "")}
+
+
+def _numbered(rows, start: int = 1):
+    """enumerate(rows, start), raising ImportAborted with the number of the row that couldn't be read."""
+    rows = iter(rows)
+    row_number = start
+    while True:
+        try:
+            row = next(rows)
+        except StopIteration:
+            return
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise ImportAborted(row_number, e)
+        yield row_number, row
+        row_number += 1
+
+
+def iter_records(stream, import_format: str):
+    """Yield (row_number, record) pairs; record is an exception for unparseable rows."""
+    if import_format == "csv":
+        # strict: malformed quoting is an error instead of being silently glued into a field
+        rows = _numbered(csv.reader(stream, strict=True), start=0)
+        _, header = next(rows, (0, None))
+        if header is None:
+            return
+        keys = [CSV_HEADER_ALIASES.get(name.strip().lower(), name.strip().lower()) for name in header]
+        for row_number, row in rows:
+            if not any(row):
+                continue
+            yield row_number, _clean(dict(zip(keys, row)))
+        return
+
+    for row_number, line in _numbered(stream):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield row_number, e
+            continue
+        yield row_number, _clean(record) if isinstance(record, dict) else ValueError("Expected a JSON object")
+
+
+def _describe(error: Exception):
+    if isinstance(error, ValidationError):
+        return [f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in error.errors()]
+    return [str(error)]
+
+
+def _insert_batch(db: Session, user_id: int, batch: list):
+    db.execute(models.Task.__table__.insert(), batch)
+
+    buckets = rollups.apply_many(db, user_id, ((row["created_at"], rollups.contribution(row)) for row in batch))
+    for day in sorted({bucket.date() for bucket in buckets}):
+        crud.record_activity(db, user_id, day)
+    db.commit()
+
+
+def import_tasks(db: Session, user_id: int, stream, import_format: str, batch_size: int = DEFAULT_BATCH_SIZE):
+    """Validate and insert tasks read from a text stream; returns a TaskImportResult dict."""
+    imported, failed, errors = 0, 0, []
+    batch = []
+    try:
+        for row_number, record in iter_records(stream, import_format):
+            try:
+                if isinstance(record, Exception):
+                    raise record
+                task = schemas.TaskCreate(**record)
+            except (ValidationError, ValueError, TypeError) as e:
+                failed += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"row": row_number, "errors": _describe(e)})
+                continue
+
+            batch.append({**task.dict(), "owner_id": user_id, "created_at": datetime.utcnow()})
+            if len(batch) >= batch_size:
+                _insert_batch(db, user_id, batch)
+                imported += len(batch)
+                batch = []
+    except ImportAborted as e:
+        # Earlier batches are committed already; keep the import consistent up to the bad row
+        if batch:
+            _insert_batch(db, user_id, batch)
+            imported += len(batch)
+        e.result = {"imported": imported, "failed": failed, "errors": errors}
+        raise
+    if batch:
+        _insert_batch(db, user_id, batch)
+        imported += len(batch)
+    return {"imported": imported, "failed": failed, "errors": errors}
+
+
+def open_text(binary_file):
+    """Decode the spooled request body for the csv/json readers (BOM-tolerant UTF-8).
+
+    Line by line rather than through a TextIOWrapper, whose chunked decoding would raise
+    a UnicodeDecodeError rows before the offending one."""
+    binary_file.seek(0)
+    for index, line in enumerate(binary_file):
+        yield line.decode("utf-8-sig" if index == 0 else "utf-8")
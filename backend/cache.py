@@ -0,0 +1,221 @@
+"""
+Small caching layer with swappable backends.
+
+MemoryCacheBackend is an in-process LRU with a per-entry TTL, which is enough for a
+single worker. Multi-worker deployments point ANALYTICS_CACHE_URL at Redis so every
+worker shares one cache and an invalidation on one worker is seen by all of them.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:  # optional, only needed for the shared backend
+    redis = None
+
+MISSING = object()
+
+
+class CacheBackend:
+    """Interface shared by the cache backends. Values must be JSON-serializable."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str):
+        raise NotImplementedError
+
+    def set(self, key: str, value, ttl: float = None, computed_since: float = None):
+        """Store `value`; `computed_since` skips the write if `key` was deleted after that time."""
+        raise NotImplementedError
+
+    def delete(self, *keys: str):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def size(self) -> int:
+        return 0
+
+    def get_or_set(self, key: str, compute):
+        value = self.get(key)
+        if value is MISSING:
+            started = time.monotonic()
+            value = compute()
+            self.set(key, value, computed_since=started)
+        return value
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self).__name__,
+            "size": self.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class MemoryCacheBackend(CacheBackend):
+    def __init__(self, max_entries: int = 1024, ttl: float = 60.0):
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._deleted_at = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value, ttl: float = None, computed_since: float = None):
+        with self._lock:
+            if computed_since is not None and self._deleted_at.get(key, float("-inf")) >= computed_since:
+                # invalidated while the value was being computed, so it may already be stale
+                return
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys: str):
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+                self._deleted_at[key] = now
+                self._deleted_at.move_to_end(key)
+            while len(self._deleted_at) > self.max_entries:
+                self._deleted_at.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+# SET unless the key's tombstone (the wall-clock time of its last delete) is newer than
+# ARGV[3], the time the value started being computed; atomic, so no delete slips in between
+_SET_UNLESS_DELETED = """
+local deleted_at = redis.call('GET', KEYS[2])
+if ARGV[3] ~= '' and deleted_at and tonumber(deleted_at) >= tonumber(ARGV[3]) then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+return 1
+"""
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Shared cache in Redis. Deletes leave a tombstone holding their wall-clock time, so
+    the invalidation race guard of `computed_since` holds across workers too. Worker
+    clocks can disagree slightly, so a value is also dropped if the delete came up to
+    CLOCK_SKEW seconds before its computation started (it is just recomputed next time).
+    """
+
+    CLOCK_SKEW = 1.0
+    # Must outlast the slowest computation
+    MIN_TOMBSTONE_TTL = 60.0
+
+    def __init__(self, url: str, ttl: float = 60.0, prefix: str = "taskflow:"):
+        super().__init__()
+        if redis is None:
+            raise RuntimeError("The 'redis' package is required for a redis:// cache URL")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self._set_unless_deleted = self.client.register_script(_SET_UNLESS_DELETED)
+
+    def _tombstone(self, key: str) -> str:
+        return f"{self.prefix}deleted:{key}"
+
+    def get(self, key: str):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            self.misses += 1
+            return MISSING
+        self.hits += 1
+        return json.loads(raw)
+
+    def set(self, key: str, value, ttl: float = None, computed_since: float = None):
+        # Milliseconds: ex=int(ttl) would turn sub-second TTLs into 0, which Redis rejects
+        ttl_ms = max(1, int((self.ttl if ttl is None else ttl) * 1000))
+        if computed_since is None:
+            self.client.set(self.prefix + key, json.dumps(value, default=str), px=ttl_ms)
+            return
+        # computed_since is this process's monotonic clock; tombstones hold wall-clock time
+        started_at = time.time() - (time.monotonic() - computed_since) - self.CLOCK_SKEW
+        self._set_unless_deleted(
+            keys=[self.prefix + key, self._tombstone(key)],
+            args=[json.dumps(value, default=str), ttl_ms, repr(started_at)],
+        )
+
+    def delete(self, *keys: str):
+        if keys:
+            now = repr(time.time())
+            tombstone_ms = int(max(self.ttl, self.MIN_TOMBSTONE_TTL) * 1000)
+            pipe = self.client.pipeline()
+            pipe.delete(*(self.prefix + key for key in keys))
+            for key in keys:
+                pipe.set(self._tombstone(key), now, px=tombstone_ms)
+            pipe.execute()
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def size(self) -> int:
+        tombstones = self._tombstone("").encode()
+        return sum(1 for key in self.client.scan_iter(match=self.prefix + "*") if not key.startswith(tombstones))
+
+
+def create_backend(url: str = None, max_entries: int = 1024, ttl: float = 60.0) -> CacheBackend:
+    if url and url.startswith(("redis://", "rediss://")):
+        return RedisCacheBackend(url, ttl=ttl)
+    return MemoryCacheBackend(max_entries=max_entries, ttl=ttl)
+
+
+# --- Analytics (crud.get_task_stats) cache, keyed on (user_id, period) ---
+ANALYTICS_PERIODS = ("day", "week", "month")
+
+analytics_cache = create_backend(
+    os.environ.get("ANALYTICS_CACHE_URL"),
+    max_entries=int(os.environ.get("ANALYTICS_CACHE_SIZE", "1024")),
+    ttl=float(os.environ.get("ANALYTICS_CACHE_TTL", "60")),
+)
+
+
+def analytics_key(user_id: int, period: str) -> str:
+    # crud.get_task_stats treats any unknown period as "week"
+    return f"task_stats:{user_id}:{period if period in ANALYTICS_PERIODS else 'week'}"
+
+
+def invalidate_task_stats(user_id: int):
+    analytics_cache.delete(*(analytics_key(user_id, period) for period in ANALYTICS_PERIODS))
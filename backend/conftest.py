@@ -0,0 +1,60 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool, StaticPool
+
+import auth, cache, database, models, search
+from main import app
+
+
+@pytest.fixture
+def db_session(monkeypatch, tmp_path):
+    # A file rather than :memory:, so the sync and async engines see the same database
+    path = tmp_path / "test.db"
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    # No pooling: TestClient may run each request on a new event loop
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)
+    models.Base.metadata.create_all(bind=engine)
+    search.setup(engine)
+    TestingSession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def override_get_db():
+        db = TestingSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    TestingAsyncSession = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with TestingAsyncSession() as db:
+            yield db
+
+    app.dependency_overrides[database.get_db] = override_get_db
+    app.dependency_overrides[database.get_async_db] = override_get_async_db
+    monkeypatch.setattr(database, "SessionLocal", TestingSession)
+    monkeypatch.setattr(database, "AsyncSessionLocal", TestingAsyncSession)
+    cache.analytics_cache.clear()
+    auth.user_cache.clear()
+    session = TestingSession()
+    yield session
+    session.close()
+    app.dependency_overrides.clear()
+    engine.dispose()
+
+
+@pytest.fixture
+def user(db_session):
+    db_user = models.User(email="owner@example.com", hashed_password="x", full_name="Owner")
+    db_session.add(db_user)
+    db_session.commit()
+    return db_user
+
+
+@pytest.fixture
+def client(user):
+    token = auth.create_access_token(data={"sub": user.email})
+    return TestClient(app, headers={"Authorization": f"Bearer {token}"})
@@ -1,6 +1,15 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import extract, cast, Date
-import models, schemas
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from sqlalchemy import func, case, and_, or_, select, tuple_, DateTime
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from datetime import date, datetime, timedelta
+import base64
+import json
+import models, schemas, rollups, notifications
+import search as search_index
+import auth
 from auth import get_password_hash
 
 def get_user(db: Session, user_id: int):
@@ -35,6 +44,7 @@ def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate):
         db.add(db_user)
         db.commit()
         db.refresh(db_user)
+        auth.invalidate_user(db_user.id)
     return db_user
 
 def set_reset_token(db: Session, email: str, token: str):
@@ -59,24 +69,154 @@ def reset_password(db: Session, token: str, new_password: str):
         db.refresh(user)
     return user
 
-def complete_password_reset(db: Session, user: models.User, new_password: str):
-    user.hashed_password = get_password_hash(new_password)
+def complete_password_reset(db: Session, user: models.User, new_password: str = None, hashed_password: str = None):
+    user.hashed_password = hashed_password or get_password_hash(new_password)
     user.reset_token = None
     db.commit()
     db.refresh(user)
+    auth.invalidate_user(user.id)
     return user
 
-def get_tasks(db: Session, user_id: int, skip: int = 0, limit: int = 100, status: str = None, search: str = None):
+TASK_SORTS = ("created_at", "due_date", "priority")
+
+def _sort_segments(sort: str):
+    """
+    Split a task sort into index-backed segments of (filters, key columns, descending).
+
+    Each segment is served by one of the composite (owner_id, ..., id) indexes on tasks.
+    Priority walks one segment per level (high first, then tasks whose priority was
+    cleared) and due_date keeps undated tasks last, so the order is the same on SQLite
+    and Postgres.
+    """
+    Task = models.Task
+    if sort == "priority":
+        levels = (models.TaskPriority.HIGH, models.TaskPriority.MEDIUM, models.TaskPriority.LOW)
+        segments = [([Task.priority == level], [Task.id], False) for level in levels]
+        # TaskUpdate can set priority to null
+        return segments + [([Task.priority.is_(None)], [Task.id], False)]
+    if sort == "due_date":
+        return [
+            ([Task.due_date.is_not(None)], [Task.due_date, Task.id], False),
+            ([Task.due_date.is_(None)], [Task.id], False),
+        ]
+    # created_at (default): newest first
+    return [([], [Task.created_at, Task.id], True)]
+
+def _encode_cursor(sort: str, segment: int, values: list) -> str:
+    payload = json.dumps([sort, segment, [v.isoformat() if isinstance(v, datetime) else v for v in values]])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str, sort: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, segment, values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        segments = _sort_segments(sort)
+        if cursor_sort != sort or not 0 <= segment < len(segments) or len(values) != len(segments[segment][1]):
+            raise ValueError
+        columns = segments[segment][1]
+        return segment, [
+            datetime.fromisoformat(v) if isinstance(c.type, DateTime) else v
+            for c, v in zip(columns, values)
+        ]
+    except (ValueError, TypeError, IndexError):
+        raise ValueError("Invalid cursor for this sort")
+
+def _filtered_tasks(db: Session, user_id: int, status: str = None, search: str = None):
+    """Return (query, matches); `matches` is the ranked full-text subquery when one is used."""
     query = db.query(models.Task).filter(models.Task.owner_id == user_id)
+    matches = None
     if status:
         query = query.filter(models.Task.status == status)
     if search:
-        query = query.filter(models.Task.title.contains(search))
-    return query.offset(skip).limit(limit).all()
+        matches = search_index.ranked_matches(db, user_id, search)
+        if matches is not None:
+            query = query.join(matches, matches.c.task_id == models.Task.id)
+        else:
+            pattern = f"%{search}%"
+            query = query.filter(or_(models.Task.title.like(pattern), models.Task.description.like(pattern)))
+    return query, matches
+
+def _task_detail_options():
+    # Everything schemas.Task serializes, in a fixed number of statements instead of lazy loads
+    return (
+        selectinload(models.Task.owner),
+        selectinload(models.Task.comments).selectinload(models.Comment.author),
+        selectinload(models.Task.attachments),
+    )
+
+def _with_counts(query):
+    comment_count = select(func.count(models.Comment.id)).where(
+        models.Comment.task_id == models.Task.id
+    ).correlate(models.Task).scalar_subquery()
+    attachment_count = select(func.count(models.Attachment.id)).where(
+        models.Attachment.task_id == models.Task.id
+    ).correlate(models.Task).scalar_subquery()
+    return query.add_columns(comment_count.label("comment_count"), attachment_count.label("attachment_count"))
+
+def _summaries(rows):
+    summaries = []
+    for task, comment_count, attachment_count in rows:
+        summary = {column.key: getattr(task, column.key) for column in models.Task.__table__.columns}
+        summary.update(comment_count=comment_count, attachment_count=attachment_count)
+        summaries.append(summary)
+    return summaries
+
+def get_tasks(db: Session, user_id: int, skip: int = 0, limit: int = 100, status: str = None, search: str = None, sort: str = None, summary: bool = False):
+    """List tasks; `summary` returns scalar-column dicts with comment/attachment counts instead of full tasks."""
+    query, matches = _filtered_tasks(db, user_id, status=status, search=search)
+    query = _with_counts(query) if summary else query.options(*_task_detail_options())
+    if matches is not None and not sort:
+        # best full-text matches first
+        query = query.order_by(matches.c.rank, models.Task.id)
+    elif sort:
+        order = []
+        segments = _sort_segments(sort)
+        if len(segments) > 1:
+            order.append(case(*((and_(*filters), i) for i, (filters, _, _) in enumerate(segments))))
+        for column in segments[0][1]:
+            order.append(column.desc() if segments[0][2] else column)
+        query = query.order_by(*order)
+    else:
+        query = query.order_by(models.Task.id)
+    rows = query.offset(skip).limit(limit).all()
+    return _summaries(rows) if summary else rows
+
+def get_task_page(db: Session, user_id: int, limit: int = 100, status: str = None, search: str = None, sort: str = None, cursor: str = None, summary: bool = False):
+    """Keyset pagination: return (tasks, next_cursor), next_cursor being None on the last page."""
+    sort = sort or "created_at"
+    segments = _sort_segments(sort)
+    start, after = _decode_cursor(cursor, sort) if cursor else (0, None)
+
+    rows = []
+    for index in range(start, len(segments)):
+        filters, columns, descending = segments[index]
+        query = _filtered_tasks(db, user_id, status=status, search=search)[0].filter(*filters)
+        if after is not None and index == start:
+            key = tuple_(*columns)
+            query = query.filter(key < tuple(after) if descending else key > tuple(after))
+        query = query.order_by(*(column.desc() if descending else column for column in columns))
+        query = _with_counts(query) if summary else query.options(*_task_detail_options())
+        rows.extend((index, row) for row in query.limit(limit + 1 - len(rows)).all())
+        if len(rows) > limit:
+            break
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        # Empty when limit <= 0: the endpoint rejects that, direct callers get no cursor
+        if rows:
+            index, last = rows[-1]
+            last = last[0] if summary else last
+            next_cursor = _encode_cursor(sort, index, [getattr(last, column.key) for column in segments[index][1]])
+    rows = [row for _, row in rows]
+    return (_summaries(rows) if summary else rows), next_cursor
 
 def create_task(db: Session, task: schemas.TaskCreate, user_id: int):
     db_task = models.Task(**task.dict(), owner_id=user_id)
     db.add(db_task)
+    db.flush()
+    record_activity(db, user_id, db_task.created_at.date())
+    rollups.add_task(db, db_task)
     db.commit()
     db.refresh(db_task)
     return db_task
@@ -84,24 +224,145 @@ def create_task(db: Session, task: schemas.TaskCreate, user_id: int):
 def get_task(db: Session, task_id: int):
     return db.query(models.Task).filter(models.Task.id == task_id).first()
 
+def get_task_detail(db: Session, task_id: int):
+    """get_task with the owner, comments (and their authors) and attachments eagerly loaded."""
+    return db.query(models.Task).options(*_task_detail_options()).filter(models.Task.id == task_id).first()
+
 def delete_task(db: Session, task_id: int):
     db_task = db.query(models.Task).filter(models.Task.id == task_id).first()
     if db_task:
         db.delete(db_task)
+        db.flush()
+        forget_activity(db, db_task.owner_id, db_task.created_at.date())
+        rollups.remove_task(db, db_task)
         db.commit()
     return db_task
 
+def changed_fields(db_task: models.Task, task: schemas.TaskUpdate) -> List[str]:
+    """Fields of `task` that would actually change `db_task`."""
+    return [key for key, value in task.dict(exclude_unset=True).items() if getattr(db_task, key) != value]
+
+def bump_version(db: Session, db_task: models.Task):
+    # Incremented in SQL: overlapping updates each bump it (last write wins) instead of the
+    # later one failing a version check
+    if db.is_modified(db_task):
+        db_task.version = models.Task.version + 1
+
 def update_task(db: Session, task_id: int, task: schemas.TaskUpdate):
     db_task = db.query(models.Task).filter(models.Task.id == task_id).first()
     if db_task:
+        before = rollups.snapshot(db_task)
         update_data = task.dict(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_task, key, value)
         db.add(db_task)
+        rollups.replace_task(db, before, db_task)
+        bump_version(db, db_task)
         db.commit()
         db.refresh(db_task)
     return db_task
 
+# Async variants for the async endpoints: the same logic run through AsyncSession.run_sync,
+# so the database round trips don't block the event loop. Relations the response needs are
+# loaded inside run_sync, since an AsyncSession cannot lazy-load them afterwards.
+# A `notification` is staged in the session first, so the write's commit stores it with the
+# change (and a write that doesn't happen rolls it back); wake the outbox afterwards.
+
+def _stage(session: Session, notification: Optional[notifications.Notification]):
+    if notification is not None:
+        notifications.outbox.add(session, notification)
+
+async def get_user_by_email_async(db: AsyncSession, email: str):
+    return await db.run_sync(get_user_by_email, email)
+
+async def set_reset_token_async(db: AsyncSession, email: str, token: str):
+    return await db.run_sync(set_reset_token, email, token)
+
+async def complete_password_reset_async(db: AsyncSession, user: models.User, hashed_password: str):
+    return await db.run_sync(lambda session: complete_password_reset(session, user, hashed_password=hashed_password))
+
+async def get_task_async(db: AsyncSession, task_id: int):
+    return await db.run_sync(get_task, task_id)
+
+async def get_task_detail_async(db: AsyncSession, task_id: int):
+    return await db.run_sync(get_task_detail, task_id)
+
+async def create_task_async(db: AsyncSession, task: schemas.TaskCreate, user_id: int, notification: Optional[notifications.Notification] = None):
+    def create(session: Session):
+        _stage(session, notification)
+        return get_task_detail(session, create_task(session, task, user_id).id)
+    return await db.run_sync(create)
+
+async def update_task_async(db: AsyncSession, task_id: int, task: schemas.TaskUpdate, notification: Optional[notifications.Notification] = None):
+    def update(session: Session):
+        _stage(session, notification)
+        if update_task(session, task_id, task) is None:
+            # Nothing was written; don't leave the notification for a later commit
+            session.rollback()
+            return None
+        return get_task_detail(session, task_id)
+    return await db.run_sync(update)
+
+async def delete_task_async(db: AsyncSession, task_id: int):
+    return await db.run_sync(delete_task, task_id)
+
+async def update_tasks_async(db: AsyncSession, tasks: List[models.Task], updates: List[schemas.TaskBatchItem], notification: Optional[notifications.Notification] = None):
+    """update_tasks, returning the updated tasks' summaries."""
+    def update(session: Session):
+        _stage(session, notification)
+        update_tasks(session, tasks, updates)
+        # The async session doesn't expire on commit; reload the bumped versions
+        session.expire_all()
+        return get_task_summaries(session, [task.id for task in tasks])
+    return await db.run_sync(update)
+
+async def delete_tasks_async(db: AsyncSession, tasks: List[models.Task], notification: Optional[notifications.Notification] = None):
+    def delete(session: Session):
+        _stage(session, notification)
+        return delete_tasks(session, tasks)
+    return await db.run_sync(delete)
+
+# Upper bound on the tasks a single batch request may touch
+MAX_BATCH_SIZE = 1000
+
+def get_tasks_by_ids(db: Session, task_ids: List[int]):
+    return db.query(models.Task).filter(models.Task.id.in_(task_ids)).all()
+
+def get_task_summaries(db: Session, task_ids: List[int]):
+    query = _with_counts(db.query(models.Task).filter(models.Task.id.in_(task_ids)).order_by(models.Task.id))
+    return _summaries(query.all())
+
+def update_tasks(db: Session, tasks: List[models.Task], updates: List[schemas.TaskBatchItem]):
+    """Apply per-task changes to already-loaded tasks in a single transaction."""
+    tasks_by_id = {task.id: task for task in tasks}
+    before = {task.id: rollups.snapshot(task) for task in tasks}
+    for item in updates:
+        for key, value in item.dict(exclude_unset=True, exclude={"id"}).items():
+            setattr(tasks_by_id[item.id], key, value)
+    for owner_id in {task.owner_id for task in tasks}:
+        rollups.apply_many(db, owner_id, (
+            (task.created_at, rollups.replacement(before[task.id], task))
+            for task in tasks if task.owner_id == owner_id
+        ))
+    for task in tasks:
+        bump_version(db, task)
+    db.commit()
+    return tasks
+
+def delete_tasks(db: Session, tasks: List[models.Task]):
+    """Delete tasks with their comments and attachments using set-based statements."""
+    task_ids = [task.id for task in tasks]
+    removed = [rollups.snapshot(task) for task in tasks]
+    db.query(models.Comment).filter(models.Comment.task_id.in_(task_ids)).delete(synchronize_session=False)
+    db.query(models.Attachment).filter(models.Attachment.task_id.in_(task_ids)).delete(synchronize_session=False)
+    db.query(models.Task).filter(models.Task.id.in_(task_ids)).delete(synchronize_session=False)
+    for owner_id in {fields["owner_id"] for fields in removed}:
+        owned = [fields for fields in removed if fields["owner_id"] == owner_id]
+        rollups.apply_many(db, owner_id, ((fields["created_at"], rollups.contribution(fields, sign=-1)) for fields in owned))
+        forget_activity(db, owner_id, *{fields["created_at"].date() for fields in owned})
+    db.commit()
+    return task_ids
+
 def create_comment(db: Session, comment: schemas.CommentCreate, task_id: int, user_id: int):
     db_comment = models.Comment(**comment.dict(), task_id=task_id, author_id=user_id)
     db.add(db_comment)
@@ -116,133 +377,177 @@ def create_attachment(db: Session, attachment: dict, task_id: int):
     db.refresh(db_attachment)
     return db_attachment
 
+def _scan_streak(db: Session, user_id: int):
+    """Return (streak, last_active_date) for the most recent run of consecutive active days."""
+    # date() is understood by both SQLite and Postgres; CAST(... AS DATE) is not portable to SQLite
+    active_days = db.query(func.date(models.Task.created_at).label('day')).filter(
+        models.Task.owner_id == user_id
+    ).distinct().order_by(func.date(models.Task.created_at).desc())
+
+    streak, last_active, expected = 0, None, None
+    for row in active_days.yield_per(256):
+        day = row.day if isinstance(row.day, date) else date.fromisoformat(str(row.day))
+        if last_active is None:
+            last_active = expected = day
+        if day != expected:
+            break
+        streak += 1
+        expected = day - timedelta(days=1)
+    return streak, last_active
+
+def _store_streak(db: Session, user_id: int, streak: int, last_active: date):
+    row = db.get(models.UserActivityStreak, user_id)
+    if row is None:
+        row = models.UserActivityStreak(user_id=user_id)
+        db.add(row)
+    row.streak = streak
+    row.last_active_date = last_active
+
+def record_activity(db: Session, user_id: int, day: date):
+    """Extend the stored streak for a task created on `day`; the caller commits."""
+    row = db.get(models.UserActivityStreak, user_id)
+    scanned = row is None or row.last_active_date is None
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        # Upserted against the stored row, like the rollups, so concurrent task writes
+        # neither race to insert it nor extend it from a stale read
+        Streak = models.UserActivityStreak
+        streak, last_active = _scan_streak(db, user_id) if scanned else (1, day)
+        upsert = (sqlite_insert if dialect == "sqlite" else pg_insert)(Streak).values(
+            user_id=user_id, streak=streak, last_active_date=last_active,
+        )
+        previous = Streak.last_active_date
+        upsert = upsert.on_conflict_do_update(
+            index_elements=[Streak.user_id],
+            set_={
+                "streak": case(
+                    (previous.is_(None), upsert.excluded.streak),
+                    (previous == day - timedelta(days=1), Streak.streak + 1),
+                    (previous < day, 1),
+                    else_=Streak.streak,
+                ),
+                "last_active_date": case(
+                    (previous.is_(None), upsert.excluded.last_active_date),
+                    (previous < day, day),
+                    else_=previous,
+                ),
+            },
+        )
+        db.execute(upsert)
+        if row is not None:
+            db.expire(row)
+        return
+
+    if scanned:
+        _store_streak(db, user_id, *_scan_streak(db, user_id))
+    elif row.last_active_date == day - timedelta(days=1):
+        row.streak += 1
+        row.last_active_date = day
+    elif row.last_active_date < day:
+        row.streak = 1
+        row.last_active_date = day
+
+def forget_activity(db: Session, user_id: int, *days: date):
+    """Re-derive the stored streak if removed tasks may have been the only ones on their days."""
+    row = db.get(models.UserActivityStreak, user_id)
+    if row is None or row.last_active_date is None:
+        return
+    if any(row.last_active_date - timedelta(days=row.streak) < day <= row.last_active_date for day in days):
+        _store_streak(db, user_id, *_scan_streak(db, user_id))
+
+def get_current_streak(db: Session, user_id: int, today: date):
+    row = db.get(models.UserActivityStreak, user_id)
+    if row is None:
+        # Not materialized yet (e.g. existing data); the next task write stores it
+        streak, last_active = _scan_streak(db, user_id)
+    else:
+        streak, last_active = row.streak, row.last_active_date
+    return streak if last_active == today else 0
+
+def _count_where(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
 def get_task_stats(db: Session, user_id: int, period: str = "week"):
-    total = db.query(models.Task).filter(models.Task.owner_id == user_id).count()
-    completed = db.query(models.Task).filter(models.Task.owner_id == user_id, models.Task.status == models.TaskStatus.DONE).count()
-    pending = db.query(models.Task).filter(models.Task.owner_id == user_id, models.Task.status != models.TaskStatus.DONE).count()
-    high_priority = db.query(models.Task).filter(models.Task.owner_id == user_id, models.Task.priority == models.TaskPriority.HIGH).count()
-    
-    from datetime import datetime, timedelta
-    from sqlalchemy import func
-    
-    today = datetime.utcnow().date()
+    # --- Totals, breakdowns and avg completion time in a single pass ---
+    done = models.Task.status == models.TaskStatus.DONE
+    totals = db.query(
+        func.count(models.Task.id).label('total'),
+        _count_where(done).label('completed'),
+        _count_where(models.Task.status != models.TaskStatus.DONE).label('pending'),
+        _count_where(models.Task.status == models.TaskStatus.TODO).label('todo'),
+        _count_where(models.Task.status == models.TaskStatus.IN_PROGRESS).label('in_progress'),
+        _count_where(models.Task.priority == models.TaskPriority.LOW).label('low'),
+        _count_where(models.Task.priority == models.TaskPriority.MEDIUM).label('medium'),
+        _count_where(models.Task.priority == models.TaskPriority.HIGH).label('high'),
+        func.avg(case((and_(done, models.Task.time_spent > 0), models.Task.time_spent))).label('avg_time'),
+    ).filter(models.Task.owner_id == user_id).one()
+
+    total = totals.total
+    completed = int(totals.completed)
+    high_priority = int(totals.high)
 
-    # --- Priority breakdown ---
-    low_count = db.query(models.Task).filter(models.Task.owner_id == user_id, models.Task.priority == models.TaskPriority.LOW).count()
-    medium_count = db.query(models.Task).filter(models.Task.owner_id == user_id, models.Task.priority == models.TaskPriority.MEDIUM).count()
     priority_breakdown = [
-        {"label": "Low", "value": low_count},
-        {"label": "Medium", "value": medium_count},
+        {"label": "Low", "value": int(totals.low)},
+        {"label": "Medium", "value": int(totals.medium)},
         {"label": "High", "value": high_priority},
     ]
-
-    # --- Status breakdown ---
-    todo_count = db.query(models.Task).filter(models.Task.owner_id == user_id, models.Task.status == models.TaskStatus.TODO).count()
-    in_progress_count = db.query(models.Task).filter(models.Task.owner_id == user_id, models.Task.status == models.TaskStatus.IN_PROGRESS).count()
     status_breakdown = [
-        {"label": "To Do", "value": todo_count},
-        {"label": "In Progress", "value": in_progress_count},
+        {"label": "To Do", "value": int(totals.todo)},
+        {"label": "In Progress", "value": int(totals.in_progress)},
         {"label": "Done", "value": completed},
     ]
+    avg_completion_time = round(float(totals.avg_time), 1) if totals.avg_time else 0.0
 
-    # --- Avg completion time ---
-    avg_time_row = db.query(func.avg(models.Task.time_spent)).filter(
-        models.Task.owner_id == user_id,
-        models.Task.status == models.TaskStatus.DONE,
-        models.Task.time_spent is not None,
-        models.Task.time_spent > 0
-    ).scalar()
-    avg_completion_time = round(float(avg_time_row), 1) if avg_time_row else 0.0
+    today = datetime.utcnow().date()
 
     # --- Current streak (consecutive days with task activity) ---
-    current_streak = 0
-    check_date = today
-    while True:
-        day_count = db.query(models.Task).filter(
-            models.Task.owner_id == user_id,
-            cast(models.Task.created_at, Date) == check_date
-        ).count()
-        if day_count > 0:
-            current_streak += 1
-            check_date -= timedelta(days=1)
-        else:
-            break
+    current_streak = get_current_streak(db, user_id, today)
 
+    # --- Activity, read from the hourly rollups (at most 24 buckets per day) ---
+    Rollup = models.TaskDailyRollup
     if period == "day":
-        start_time = datetime.utcnow() - timedelta(hours=23)
-        
-        daily_counts = db.query(
-            extract('hour', models.Task.created_at).label('hour'),
-            func.count(models.Task.id).label('count'),
-            func.coalesce(func.sum(models.Task.time_spent), 0).label('hours')
-        ).filter(
-            models.Task.owner_id == user_id,
-            models.Task.created_at >= start_time
-        ).group_by(
-            extract('hour', models.Task.created_at)
+        now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        start_time = now - timedelta(hours=23)
+
+        hourly_rows = db.query(Rollup.day, Rollup.hour, Rollup.task_count, Rollup.time_spent).filter(
+            Rollup.user_id == user_id,
+            Rollup.day >= start_time.date()
         ).all()
-        
-        activity_map = {str(int(row.hour)).zfill(2): {"count": row.count, "hours": round(float(row.hours), 1)} for row in daily_counts}
+
+        activity_map = {(row.day, row.hour): {"count": row.task_count, "hours": round(float(row.time_spent), 1)} for row in hourly_rows}
         daily_activity = []
-        now = datetime.utcnow()
         for i in range(24):
-            hour = (now - timedelta(hours=23-i))
-            hour_str = hour.strftime("%H")
-            entry = activity_map.get(hour_str, {"count": 0, "hours": 0.0})
+            hour = start_time + timedelta(hours=i)
+            entry = activity_map.get((hour.date(), hour.hour), {"count": 0, "hours": 0.0})
             daily_activity.append({
                 "date": f"{hour.strftime('%I%p').lstrip('0')}",
                 "count": entry["count"],
                 "hours": entry["hours"]
             })
-    
-    elif period == "month":
-        num_days = 30
-        start_date = today - timedelta(days=num_days-1)
-        
-        daily_counts = db.query(
-            cast(models.Task.created_at, Date).label('date'),
-            func.count(models.Task.id).label('count'),
-            func.coalesce(func.sum(models.Task.time_spent), 0).label('hours')
-        ).filter(
-            models.Task.owner_id == user_id,
-            models.Task.created_at >= start_date
-        ).group_by(
-            cast(models.Task.created_at, Date)
-        ).all()
-        
-        activity_map = {str(day.date): {"count": day.count, "hours": round(float(day.hours), 1)} for day in daily_counts}
-        daily_activity = []
-        for i in range(num_days):
-            date = start_date + timedelta(days=i)
-            entry = activity_map.get(str(date), {"count": 0, "hours": 0.0})
-            daily_activity.append({
-                "date": date.strftime("%b %d"),
-                "count": entry["count"],
-                "hours": entry["hours"]
-            })
-    
-    else:  # week (default)
-        num_days = 7
+
+    else:
+        # month shows 30 labelled days, week (default) the last 7 weekdays
+        num_days, label_format = (30, "%b %d") if period == "month" else (7, "%a")
         start_date = today - timedelta(days=num_days-1)
-        
+
         daily_counts = db.query(
-            cast(models.Task.created_at, Date).label('date'),
-            func.count(models.Task.id).label('count'),
-            func.coalesce(func.sum(models.Task.time_spent), 0).label('hours')
+            Rollup.day,
+            func.sum(Rollup.task_count).label('count'),
+            func.sum(Rollup.time_spent).label('hours')
         ).filter(
-            models.Task.owner_id == user_id,
-            models.Task.created_at >= start_date
+            Rollup.user_id == user_id,
+            Rollup.day >= start_date
         ).group_by(
-            cast(models.Task.created_at, Date)
+            Rollup.day
         ).all()
-        
-        activity_map = {str(day.date): {"count": day.count, "hours": round(float(day.hours), 1)} for day in daily_counts}
+
+        activity_map = {row.day: {"count": int(row.count), "hours": round(float(row.hours), 1)} for row in daily_counts}
         daily_activity = []
         for i in range(num_days):
-            date = start_date + timedelta(days=i)
-            entry = activity_map.get(str(date), {"count": 0, "hours": 0.0})
+            day = start_date + timedelta(days=i)
+            entry = activity_map.get(day, {"count": 0, "hours": 0.0})
             daily_activity.append({
-                "date": date.strftime("%a"),
+                "date": day.strftime(label_format),
                 "count": entry["count"],
                 "hours": entry["hours"]
             })
@@ -250,7 +555,7 @@ def get_task_stats(db: Session, user_id: int, period: str = "week"):
     return {
         "total_tasks": total,
         "completed_tasks": completed,
-        "pending_tasks": pending,
+        "pending_tasks": int(totals.pending),
         "high_priority_tasks": high_priority,
         "completion_rate": (completed / total * 100) if total > 0 else 0,
         "daily_activity": daily_activity,
@@ -259,4 +564,3 @@ def get_task_stats(db: Session, user_id: int, period: str = "week"):
         "avg_completion_time": avg_completion_time,
         "current_streak": current_streak,
     }
-
@@ -1,33 +1,291 @@
-from sqlalchemy import create_engine
+from fastapi import Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.util import await_only
 
+import asyncio
+import hashlib
 import os
+import threading
 from dotenv import load_dotenv
 
+import cache, pooling
+
 load_dotenv()
 
 # Default to SQLite for local development if DATABASE_URL is not set
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./task_management.db")
 
+# Optional read replica; GET/HEAD requests are served from it (see ReadRouter)
+SQLALCHEMY_READ_URL = os.getenv("DATABASE_READ_URL")
+
 # Fix for some PaaS providers (like Render/Heroku) that use 'postgres://' instead of 'postgresql://'
 if SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
     SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgres://", "postgresql://", 1)
+if SQLALCHEMY_READ_URL and SQLALCHEMY_READ_URL.startswith("postgres://"):
+    SQLALCHEMY_READ_URL = SQLALCHEMY_READ_URL.replace("postgres://", "postgresql://", 1)
+
+# "production": WAL and the pragmas below on every connection, writes serialized in-process.
+# "default": SQLite's own defaults (rollback journal, no busy timeout beyond the driver's).
+SQLITE_MODE = os.getenv("SQLITE_MODE", "production")
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "16384"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+def sqlite_pragmas(mode: str = SQLITE_MODE):
+    if mode != "production":
+        return []
+    return [
+        # Readers don't block the writer and the writer doesn't block readers
+        "PRAGMA journal_mode=WAL",
+        # Safe with WAL: a power loss may lose the last commits, never corrupt the file
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+        # Negative means KiB rather than pages
+        f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}",
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+def apply_sqlite_pragmas(engine, mode: str = SQLITE_MODE):
+    pragmas = sqlite_pragmas(mode)
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+def _is_file_sqlite(url) -> bool:
+    return make_url(url).database not in (None, "", ":memory:")
+
+def create_sqlite_engine(url: str, mode: str = SQLITE_MODE, **kwargs):
+    if _is_file_sqlite(url):
+        # The QueuePool SQLAlchemy uses for SQLite files anyway, with checkout stats
+        kwargs.setdefault("poolclass", pooling.InstrumentedQueuePool)
+    sqlite_engine = create_engine(url, connect_args={"check_same_thread": False}, **kwargs)
+    apply_sqlite_pragmas(sqlite_engine, mode)
+    return sqlite_engine
+
+class WriteSerializer:
+    """
+    Lets one session at a time hold a write transaction on a SQLite database.
+
+    SQLite allows a single writer; left to itself, every other writer spins in the busy
+    handler (or fails with "database is locked" when it runs out). Sessions instead wait
+    on this lock from their first write until commit or rollback, in arrival order. If
+    the lock isn't free within the busy timeout, the session goes ahead and SQLite's own
+    locking decides.
+
+    Sync and async sessions share the lock, so they queue behind each other. Async
+    sessions wait for it in a worker thread, keeping the event loop free meanwhile.
+    """
+
+    def __init__(self, timeout: float = SQLITE_BUSY_TIMEOUT_MS / 1000):
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.waits = 0
+        self.timeouts = 0
+
+    def install(self, session_factory):
+        self._listen(session_factory, self._wait)
+
+    def install_async(self, async_session_factory):
+        # Session events fire on the sync Session inside each AsyncSession; give this
+        # factory its own Session subclass so only its sessions are listened to
+        base = async_session_factory.kw.get("sync_session_class", Session)
+        sync_session_class = type("SerializedSession", (base,), {})
+        async_session_factory.configure(sync_session_class=sync_session_class)
+        self._listen(sync_session_class, self._wait_async)
+
+    def _listen(self, target, wait):
+        def before_flush(session, flush_context, instances):
+            self.acquire(session, wait)
+
+        def do_orm_execute(orm_execute_state):
+            if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+                self.acquire(orm_execute_state.session, wait)
+
+        def after_transaction_end(session, transaction):
+            if transaction.parent is None:
+                self.release(session)
+
+        event.listen(target, "before_flush", before_flush)
+        event.listen(target, "do_orm_execute", do_orm_execute)
+        # Fires on commit, rollback and close alike
+        event.listen(target, "after_transaction_end", after_transaction_end)
+
+    def acquire(self, session, wait=None):
+        if session.info.get("write_lock"):
+            return
+        if not self.lock.acquire(blocking=False):
+            self.waits += 1
+            if not (wait or self._wait)():
+                self.timeouts += 1
+                return
+        session.info["write_lock"] = True
+
+    def _wait(self) -> bool:
+        return self.lock.acquire(timeout=self.timeout)
+
+    def _wait_async(self) -> bool:
+        # Runs in the AsyncSession's greenlet, which can await on the event loop
+        return await_only(self._acquire_in_thread())
+
+    async def _acquire_in_thread(self) -> bool:
+        waiter = asyncio.ensure_future(asyncio.to_thread(self.lock.acquire, timeout=self.timeout))
+        try:
+            return await asyncio.shield(waiter)
+        except asyncio.CancelledError:
+            # The thread may still get the lock after the request is gone; hand it back
+            waiter.add_done_callback(lambda done: done.result() and self.lock.release())
+            raise
+
+    def release(self, session):
+        if session.info.pop("write_lock", False):
+            self.lock.release()
 
-if "sqlite" in SQLALCHEMY_DATABASE_URL:
-    engine = create_engine(
-        SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-    )
-else:
-    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    def stats(self) -> dict:
+        return {"waits": self.waits, "timeouts": self.timeouts, "held": self.lock.locked()}
+
+write_serializer = None
+
+def _create_engine(url: str):
+    if "sqlite" in url:
+        return create_sqlite_engine(url)
+    return create_engine(url, **pooling.engine_args())
+
+engine = _create_engine(SQLALCHEMY_DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+if "sqlite" in SQLALCHEMY_DATABASE_URL and SQLITE_MODE == "production":
+    write_serializer = WriteSerializer()
+    write_serializer.install(SessionLocal)
+
+read_engine = _create_engine(SQLALCHEMY_READ_URL) if SQLALCHEMY_READ_URL else None
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine) if read_engine else None
+
 Base = declarative_base()
 
-def get_db():
+READ_METHODS = ("GET", "HEAD")
+# After a client's own write, its reads stay on the primary this long, so replica lag
+# doesn't hide the change from the client that made it
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+class ReadRouter:
+    """
+    Chooses the primary or the replica for each request.
+
+    GET/HEAD requests read from the replica; everything else goes to the primary and
+    pins the client (by its Authorization header, else its address) to the primary for
+    the read-your-writes window. Pins live in a cache backend, so with READ_PIN_CACHE_URL
+    pointing at Redis every worker honours them. Without a replica everything uses the
+    primary. Routes that fill a cache (auth, analytics) use get_primary_db instead.
+    """
+
+    def __init__(self, primary=None, replica=None, window: float = READ_YOUR_WRITES_SECONDS, pins: cache.CacheBackend = None):
+        # primary=None: whatever SessionLocal is at the time of the request
+        self.primary = primary
+        self.replica = replica
+        self.window = window
+        self.pins = pins or cache.create_backend(os.getenv("READ_PIN_CACHE_URL"), max_entries=16384, ttl=window)
+        self.replica_reads = 0
+        self.pinned_reads = 0
+
+    def _client_key(self, request: Request) -> str:
+        client = request.headers.get("authorization") or (request.client.host if request.client else "")
+        return "read_pin:" + hashlib.sha256(client.encode()).hexdigest()[:32]
+
+    def track(self, request: Request):
+        """Pin the client of a write request to the primary."""
+        if self.replica is not None and request.method not in READ_METHODS:
+            self.pins.set(self._client_key(request), True, ttl=self.window)
+
+    def session_factory(self, request: Request):
+        primary = self.primary or SessionLocal
+        if self.replica is None or request.method not in READ_METHODS:
+            return primary
+        if self.pins.get(self._client_key(request)) is not cache.MISSING:
+            self.pinned_reads += 1
+            return primary
+        self.replica_reads += 1
+        return self.replica
+
+    def get_db(self, request: Request):
+        db = self.session_factory(request)()
+        self.track(request)
+        try:
+            yield db
+        finally:
+            db.close()
+            # Again once the write is done, so the window covers the replica catching up
+            self.track(request)
+
+    def stats(self) -> dict:
+        return {"replica": self.replica is not None, "replica_reads": self.replica_reads, "pinned_reads": self.pinned_reads}
+
+read_router = ReadRouter(replica=ReadSessionLocal)
+
+def get_db(request: Request):
+    yield from read_router.get_db(request)
+
+def get_primary_db():
+    """A primary session even for GETs, for reads whose results are cached: a lagging
+    replica would otherwise put pre-write values back right after a write invalidated them."""
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+# Async engine for the async endpoints (aiosqlite / asyncpg), on the same database
+def _async_engine_args(url_string):
+    url = make_url(url_string)
+    kwargs = {}
+    if url.get_backend_name() == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+        if _is_file_sqlite(url):
+            kwargs = {"poolclass": pooling.InstrumentedAsyncQueuePool}
+    elif url.get_backend_name() == "postgresql":
+        url = url.set(drivername="postgresql+asyncpg")
+        kwargs = pooling.engine_args(asynchronous=True)
+        # asyncpg spells libpq's sslmode as ssl
+        if "sslmode" in url.query:
+            kwargs["connect_args"]["ssl"] = url.query["sslmode"]
+            url = url.difference_update_query(["sslmode"])
+    return url, kwargs
+
+def _create_async_engine(url_string):
+    url, kwargs = _async_engine_args(url_string)
+    try:
+        async_engine = create_async_engine(url, **kwargs)
+    except ImportError as e:
+        # Task writes, password resets and the notification outbox all run on this engine:
+        # refuse to start rather than fail every one of them later
+        raise RuntimeError(
+            f"The async database driver for {url.drivername} is not installed (missing module "
+            f"'{e.name}'); install the backend requirements with pip install -r requirements.txt"
+        ) from e
+    if url.get_backend_name() == "sqlite":
+        apply_sqlite_pragmas(async_engine.sync_engine)
+    return async_engine
+
+async_engine = _create_async_engine(SQLALCHEMY_DATABASE_URL)
+# Objects are used after commit by the response serializer, where they cannot be refreshed
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+if write_serializer is not None:
+    write_serializer.install_async(AsyncSessionLocal)
+
+async def get_async_db(request: Request):
+    # Only write routes use the async session; they always go to the primary
+    read_router.track(request)
+    try:
+        async with AsyncSessionLocal() as db:
+            yield db
+    finally:
+        read_router.track(request)
@@ -0,0 +1,179 @@
+"""
+Streaming task exports (CSV, NDJSON and Parquet).
+
+Rows are read in batches from a server-side cursor (yield_per / stream_results) and
+rendered batch by batch, so memory stays flat regardless of how many tasks a user has.
+The generators open their own session because they keep running after the endpoint
+has returned the StreamingResponse.
+"""
+import csv
+import importlib.util
+import io
+import json
+import tempfile
+import zlib
+
+from sqlalchemy import select
+
+import database, models
+
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_COLUMNS = [
+    models.Task.id,
+    models.Task.title,
+    models.Task.status,
+    models.Task.priority,
+    models.Task.time_spent,
+    models.Task.due_date,
+    models.Task.created_at,
+]
+
+CSV_HEADER = ['ID', 'Title', 'Status', 'Priority', 'Time Spent (hrs)', 'Due Date', 'Created At']
+
+# format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# Parquet row groups are buffered to this many rows before being written
+PARQUET_ROW_GROUP_SIZE = 65536
+
+
+def iter_task_batches(user_id: int, batch_size: int = EXPORT_BATCH_SIZE, session_factory=None):
+    """Yield lists of export rows for the user's tasks, oldest first."""
+    db = (session_factory or database.SessionLocal)()
+    try:
+        result = db.execute(
+            select(*EXPORT_COLUMNS)
+            .where(models.Task.owner_id == user_id)
+            .order_by(models.Task.id)
+            .execution_options(yield_per=batch_size)
+        )
+        for batch in result.partitions():
+            yield batch
+    finally:
+        db.close()
+
+
+def csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    for batch in batches:
+        for task in batch:
+            writer.writerow([
+                task.id,
+                task.title,
+                task.status.value if task.status else '',
+                task.priority.value if task.priority else '',
+                task.time_spent or 0,
+                task.due_date or '',
+                task.created_at,
+            ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def ndjson_chunks(batches):
+    for batch in batches:
+        yield "".join(
+            json.dumps({
+                "id": task.id,
+                "title": task.title,
+                "status": task.status.value if task.status else None,
+                "priority": task.priority.value if task.priority else None,
+                "time_spent": task.time_spent or 0.0,
+                "due_date": task.due_date.isoformat() if task.due_date else None,
+                "created_at": task.created_at.isoformat() if task.created_at else None,
+            }) + "\n"
+            for task in batch
+        )
+
+
+def parquet_available() -> bool:
+    """Whether pyarrow, an optional dependency, is installed; checked without importing it."""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def _pyarrow():
+    # Imported on the first Parquet export rather than at startup: it is optional and slow to import
+    import pyarrow
+    import pyarrow.parquet
+    return pyarrow
+
+
+def parquet_schema():
+    pyarrow = _pyarrow()
+    return pyarrow.schema([
+        ("id", pyarrow.int64()),
+        ("title", pyarrow.string()),
+        ("status", pyarrow.dictionary(pyarrow.int8(), pyarrow.string())),
+        ("priority", pyarrow.dictionary(pyarrow.int8(), pyarrow.string())),
+        ("time_spent", pyarrow.float64()),
+        ("due_date", pyarrow.timestamp("us")),
+        ("created_at", pyarrow.timestamp("us")),
+    ])
+
+
+def _parquet_table(rows, schema):
+    pyarrow = _pyarrow()
+    columns = list(zip(*rows)) if rows else [[] for _ in schema]
+    return pyarrow.table({
+        "id": pyarrow.array(columns[0], pyarrow.int64()),
+        "title": pyarrow.array(columns[1], pyarrow.string()),
+        "status": pyarrow.array([s.value if s else None for s in columns[2]], pyarrow.string()).dictionary_encode().cast(schema.field("status").type),
+        "priority": pyarrow.array([p.value if p else None for p in columns[3]], pyarrow.string()).dictionary_encode().cast(schema.field("priority").type),
+        "time_spent": pyarrow.array([t or 0.0 for t in columns[4]], pyarrow.float64()),
+        "due_date": pyarrow.array(columns[5], pyarrow.timestamp("us")),
+        "created_at": pyarrow.array(columns[6], pyarrow.timestamp("us")),
+    }, schema=schema)
+
+
+def parquet_chunks(batches, chunk_size: int = 65536):
+    """
+    Write a typed, zstd-compressed Parquet file and stream it back. Parquet needs its
+    footer before the file is readable, so it is spooled to a temporary file (kept in
+    memory while small) one row group at a time, then streamed.
+    """
+    pyarrow = _pyarrow()
+    schema = parquet_schema()
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as spool:
+        with pyarrow.parquet.ParquetWriter(spool, schema, compression="zstd") as writer:
+            pending = []
+            for batch in batches:
+                pending.extend(batch)
+                if len(pending) >= PARQUET_ROW_GROUP_SIZE:
+                    writer.write_table(_parquet_table(pending, schema))
+                    pending = []
+            if pending:
+                writer.write_table(_parquet_table(pending, schema))
+        spool.seek(0)
+        while True:
+            chunk = spool.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def render(export_format: str, batches):
+    if export_format == "ndjson":
+        return ndjson_chunks(batches)
+    if export_format == "parquet":
+        return parquet_chunks(batches)
+    return csv_chunks(batches)
+
+
+def gzip_chunks(chunks):
+    """Gzip a stream of text chunks on the fly."""
+    compressor = zlib.compressobj(wbits=31)  # 31 = gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -1,19 +1,21 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Union
 from datetime import timedelta
 from fastapi.encoders import jsonable_encoder
+import hmac
 import json
+import tempfile
 
 
 from fastapi.responses import StreamingResponse
-import io
-import csv
 
-import models, schemas, crud, auth, database
+import models, schemas, crud, auth, database, pooling, rollups, cache, search, exports, bulk_import, realtime, backplane, notifications
 
 models.Base.metadata.create_all(bind=database.engine)
 
@@ -57,6 +59,47 @@ def _run_migrations():
 
 _run_migrations()
 
+# create_all only builds indexes for new tables, so add missing task indexes explicitly
+def _ensure_indexes():
+    for index in models.Task.__table__.indexes:
+        try:
+            index.create(bind=database.engine, checkfirst=True)
+        except Exception as e:
+            print(f"[MIGRATION] Warning: could not create index {index.name}: {e}")
+
+_ensure_indexes()
+
+# Columns added after create_all first ran; the ALTER works on both SQLite and Postgres
+def _ensure_columns():
+    from sqlalchemy import inspect
+    try:
+        columns = {column["name"] for column in inspect(database.engine).get_columns("tasks")}
+        if "version" not in columns:
+            with database.engine.begin() as conn:
+                conn.exec_driver_sql("ALTER TABLE tasks ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+            print("[MIGRATION] Added 'version' column to tasks table.")
+    except Exception as e:
+        print(f"[MIGRATION] Warning: {e}")
+
+_ensure_columns()
+search.setup(database.engine)
+
+# Populate the analytics rollups once for databases that predate task_daily_rollups
+def _backfill_rollups():
+    db = database.SessionLocal()
+    try:
+        if db.query(models.TaskDailyRollup).first() is None and db.query(models.Task).first() is not None:
+            rollups.backfill(db)
+            db.commit()
+            print("[MIGRATION] Backfilled task_daily_rollups from existing tasks.")
+    except Exception as e:
+        db.rollback()
+        print(f"[MIGRATION] Warning: {e}")
+    finally:
+        db.close()
+
+_backfill_rollups()
+
 app = FastAPI(title="Task Management System")
 
 # CORS configuration — reads from CORS_ORIGINS env var (comma-separated) with local dev defaults
@@ -81,11 +124,16 @@ app.add_middleware(
 
 # Dependency
 get_db = database.get_db
+get_primary_db = database.get_primary_db
+get_async_db = database.get_async_db
 
 @app.post("/token", response_model=schemas.Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     user = crud.get_user_by_email(db, email=form_data.username)
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+    email, hashed_password = (user.email, user.hashed_password) if user else (None, None)
+    # Hand the connection back to the pool before the slow password check
+    db.rollback()
+    if not user or not await auth.verify_password_async(form_data.password, hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -93,7 +141,7 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
         )
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth.create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data={"sub": email}, expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -113,90 +161,234 @@ def update_user_me(user_update: schemas.UserUpdate, db: Session = Depends(get_db
     return crud.update_user(db=db, user_id=current_user.id, user_update=user_update)
 
 @app.get("/users/performance", response_model=schemas.TaskStats)
-def get_performance(db: Session = Depends(get_db), current_user: schemas.User = Depends(auth.get_current_user)):
-    return crud.get_task_stats(db, user_id=current_user.id)
-
-from fastapi import BackgroundTasks
+def get_performance(db: Session = Depends(get_primary_db), current_user: schemas.User = Depends(auth.get_current_user)):
+    return cache.analytics_cache.get_or_set(
+        cache.analytics_key(current_user.id, "week"),
+        lambda: crud.get_task_stats(db, user_id=current_user.id)
+    )
 
 @app.post("/tasks/", response_model=schemas.Task)
-async def create_task(task: schemas.TaskCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db), current_user: schemas.User = Depends(auth.get_current_user)):
-    new_task = crud.create_task(db=db, task=task, user_id=current_user.id)
+async def create_task(task: schemas.TaskCreate, db: AsyncSession = Depends(get_async_db), current_user: schemas.User = Depends(auth.get_current_user)):
+    # Email Notification, committed with the task
+    notification = notifications.Notification(
+        current_user.email,
+        "New Task Created",
+        f"You successfully created the task: '{task.title}'."
+    )
+    new_task = await crud.create_task_async(db, task=task, user_id=current_user.id, notification=notification)
+    notifications.outbox.wake()
+    cache.invalidate_task_stats(current_user.id)
     
     # WebSocket Broadcast
-    await notify_clients(json.dumps({"type": "TASK_CREATED", "task": jsonable_encoder(new_task)}))
-    
-    # Email Notification
-    background_tasks.add_task(
-        send_email_notification, 
-        email=current_user.email, 
-        subject="New Task Created", 
-        message=f"You successfully created the task: '{new_task.title}'."
-    )
+    await notify_clients(json.dumps({"type": "TASK_CREATED", "task": jsonable_encoder(new_task)}), current_user.id)
     
     return new_task
 
-@app.get("/tasks/", response_model=List[schemas.Task])
-def read_tasks(skip: int = 0, limit: int = 100, status: str = None, search: str = None, db: Session = Depends(get_db), current_user: schemas.User = Depends(auth.get_current_user)):
-    tasks = crud.get_tasks(db, user_id=current_user.id, skip=skip, limit=limit, status=status, search=search)
+@app.post("/tasks/import", response_model=schemas.TaskImportResult)
+async def import_tasks(request: Request, format: str = None, batch_size: int = bulk_import.DEFAULT_BATCH_SIZE, db: Session = Depends(get_db), current_user: schemas.User = Depends(auth.get_current_user)):
+    import_format = bulk_import.detect_format(request.headers.get("content-type"), format)
+    if import_format is None:
+        raise HTTPException(status_code=400, detail="Send text/csv or application/x-ndjson, or pass format=csv|ndjson")
+    if not 1 <= batch_size <= bulk_import.MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"batch_size must be between 1 and {bulk_import.MAX_BATCH_SIZE}")
+
+    too_large = HTTPException(status_code=413, detail=f"Import bodies are limited to {bulk_import.MAX_BODY_BYTES} bytes")
+    if int(request.headers.get("content-length") or 0) > bulk_import.MAX_BODY_BYTES:
+        raise too_large
+
+    # Spool the streamed body (in memory while small), then parse and insert off the event loop
+    aborted = None
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as body:
+        async for chunk in request.stream():
+            # Chunked uploads carry no Content-Length; count as we go
+            if body.tell() + len(chunk) > bulk_import.MAX_BODY_BYTES:
+                raise too_large
+            body.write(chunk)
+        try:
+            result = await run_in_threadpool(
+                bulk_import.import_tasks, db, current_user.id, bulk_import.open_text(body), import_format, batch_size
+            )
+        except bulk_import.ImportAborted as e:
+            # The rows before the unreadable one are imported; report both
+            aborted, result = e, e.result
+
+    if result["imported"]:
+        cache.invalidate_task_stats(current_user.id)
+        # One summary event and one email for the whole import. The import commits batch by
+        # batch, so the email is queued once it is over, before the response goes out
+        await notify_clients(json.dumps({"type": "TASKS_IMPORTED", "count": result["imported"]}), current_user.id)
+        await send_email_notification(
+            email=current_user.email,
+            subject="Tasks Imported",
+            message=f"{result['imported']} tasks were imported ({result['failed']} rows skipped)."
+        )
+    if aborted is not None:
+        raise HTTPException(status_code=400, detail={"message": str(aborted), "row": aborted.row, **result})
+    return result
+
+def _owned_tasks(db: Session, task_ids: List[int], current_user: schemas.User, action: str):
+    task_ids = list(dict.fromkeys(task_ids))
+    if not task_ids:
+        raise HTTPException(status_code=400, detail="No tasks given")
+    if len(task_ids) > crud.MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {crud.MAX_BATCH_SIZE} tasks per batch")
+    # One query for the whole batch; nothing is changed unless every task is found and owned
+    tasks = crud.get_tasks_by_ids(db, task_ids)
+    missing = sorted(set(task_ids) - {task.id for task in tasks})
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Tasks not found: {missing}")
+    if any(task.owner_id != current_user.id for task in tasks):
+        raise HTTPException(status_code=403, detail=f"Not authorized to {action} these tasks")
     return tasks
 
+@app.patch("/tasks/batch", response_model=schemas.TaskBatchUpdateResult)
+async def update_tasks(batch: schemas.TaskBatchUpdate, db: AsyncSession = Depends(get_async_db), current_user: schemas.User = Depends(auth.get_current_user)):
+    tasks = await db.run_sync(_owned_tasks, [item.id for item in batch.tasks], current_user, "update")
+    tasks_by_id = {task.id: task for task in tasks}
+    changed = {}
+    # Title and status each task will end up with, for the email
+    final = {task.id: {"title": task.title, "status": task.status} for task in sorted(tasks, key=lambda task: task.id)}
+    for item in batch.tasks:
+        changed.setdefault(item.id, set()).update(crud.changed_fields(tasks_by_id[item.id], item))
+        final[item.id].update(item.dict(exclude_unset=True, include={"title", "status"}))
+
+    # One digest email for the whole batch, committed with it
+    notification = None
+    status_changes = [task for task_id, task in final.items() if task["status"] != tasks_by_id[task_id].status]
+    if status_changes:
+        # status is Optional in TaskUpdate, so a batch can clear it
+        lines = [f"- '{task['title']}' is now '{task['status'].value if task['status'] else 'unset'}'" for task in status_changes[:20]]
+        if len(status_changes) > 20:
+            lines.append(f"...and {len(status_changes) - 20} more")
+        notification = notifications.Notification(
+            current_user.email,
+            "Tasks Updated",
+            f"{len(status_changes)} tasks changed status:\n" + "\n".join(lines)
+        )
+    summaries = await crud.update_tasks_async(db, tasks, batch.tasks, notification=notification)
+    notifications.outbox.wake()
+    cache.invalidate_task_stats(current_user.id)
+
+    # One event for the whole batch
+    diffs = [
+        {"task_id": task["id"], "version": task["version"], "changes": {field: task[field] for field in sorted(changed[task["id"]])}}
+        for task in summaries if changed[task["id"]]
+    ]
+    await notify_clients(json.dumps({"type": "TASKS_BATCH_UPDATED", "tasks": jsonable_encoder(diffs)}), current_user.id)
+    return {"updated": len(summaries), "tasks": summaries}
+
+@app.delete("/tasks/batch", response_model=schemas.TaskBatchDeleteResult)
+async def delete_tasks(batch: schemas.TaskBatchDelete, db: AsyncSession = Depends(get_async_db), current_user: schemas.User = Depends(auth.get_current_user)):
+    tasks = await db.run_sync(_owned_tasks, batch.ids, current_user, "delete")
+    titles = [task.title for task in tasks]
+    lines = [f"- '{title}'" for title in titles[:20]]
+    if len(titles) > 20:
+        lines.append(f"...and {len(titles) - 20} more")
+    notification = notifications.Notification(
+        current_user.email,
+        "Tasks Deleted",
+        f"{len(titles)} tasks were deleted:\n" + "\n".join(lines)
+    )
+    task_ids = await crud.delete_tasks_async(db, tasks, notification=notification)
+    notifications.outbox.wake()
+    cache.invalidate_task_stats(current_user.id)
+
+    await notify_clients(json.dumps({"type": "TASKS_BATCH_DELETED", "task_ids": task_ids}), current_user.id)
+    return {"deleted": len(task_ids), "ids": task_ids}
+
+MAX_PAGE_SIZE = 1000
+
+@app.get("/tasks/", response_model=Union[List[schemas.Task], List[schemas.TaskSummary], schemas.TaskPage, schemas.TaskSummaryPage])
+def read_tasks(skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), status: str = None, search: str = None, sort: str = None, cursor: str = None, view: str = "full", db: Session = Depends(get_db), current_user: schemas.User = Depends(auth.get_current_user)):
+    if sort and sort not in crud.TASK_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(crud.TASK_SORTS)}")
+    if view not in ("full", "summary"):
+        raise HTTPException(status_code=400, detail="view must be 'full' or 'summary'")
+    # view=summary: scalar columns plus comment/attachment counts, no nested owner/comments/attachments
+    summary = view == "summary"
+    if cursor is None:
+        # Offset mode, kept for existing clients
+        return crud.get_tasks(db, user_id=current_user.id, skip=skip, limit=limit, status=status, search=search, sort=sort, summary=summary)
+
+    # Cursor mode: pass an empty cursor for the first page, then each page's next_cursor
+    try:
+        tasks, next_cursor = crud.get_task_page(db, user_id=current_user.id, limit=limit, status=status, search=search, sort=sort, cursor=cursor, summary=summary)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": tasks, "next_cursor": next_cursor}
+
 @app.get("/tasks/export")
-def export_tasks(db: Session = Depends(get_db), current_user: schemas.User = Depends(auth.get_current_user)):
-    tasks = crud.get_tasks(db, user_id=current_user.id, limit=1000) # Get all tasks for simplicity
-    user_tasks = tasks # Tasks are already filtered by user_id
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['ID', 'Title', 'Status', 'Priority', 'Time Spent (hrs)', 'Due Date', 'Created At'])
-    
-    for task in user_tasks:
-        writer.writerow([task.id, task.title, task.status, task.priority, task.time_spent or 0, task.due_date or '', task.created_at])
-    
-    output.seek(0)
+def export_tasks(request: Request, format: str = "csv", gzip: bool = False, current_user: schemas.User = Depends(auth.get_current_user)):
+    if format not in exports.EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(exports.EXPORT_FORMATS)}")
+    if format == "parquet" and not exports.parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export requires the optional 'pyarrow' package")
+
+    media_type, extension = exports.EXPORT_FORMATS[format]
+    # Streamed from the replica when there is one
+    batches = exports.iter_task_batches(current_user.id, session_factory=database.read_router.session_factory(request))
+    chunks = exports.render(format, batches)
+    filename = f"tasks_export.{extension}"
+    # Parquet is already compressed column by column
+    if gzip and format != "parquet":
+        chunks = exports.gzip_chunks(chunks)
+        filename += ".gz"
+        media_type = "application/gzip"
     return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=tasks_export.csv"}
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
 @app.get("/tasks/{task_id}", response_model=schemas.Task)
 def read_task(task_id: int, db: Session = Depends(get_db), current_user: schemas.User = Depends(auth.get_current_user)):
-    db_task = crud.get_task(db, task_id=task_id)
+    db_task = crud.get_task_detail(db, task_id=task_id)
     if db_task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     return db_task
 
 @app.delete("/tasks/{task_id}", response_model=schemas.Task)
-async def delete_task(task_id: int, db: Session = Depends(get_db), current_user: schemas.User = Depends(auth.get_current_user)):
-    # Check ownership
-    db_task = crud.get_task(db, task_id=task_id)
+async def delete_task(task_id: int, db: AsyncSession = Depends(get_async_db), current_user: schemas.User = Depends(auth.get_current_user)):
+    # Check ownership; loaded with its relations because the deleted task is returned
+    db_task = await crud.get_task_detail_async(db, task_id=task_id)
     if db_task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     if db_task.owner_id != current_user.id:
          raise HTTPException(status_code=403, detail="Not authorized to delete this task")
-    crud.delete_task(db=db, task_id=task_id)
-    await notify_clients(json.dumps({"type": "TASK_DELETED", "task_id": task_id}))
+    await crud.delete_task_async(db, task_id=task_id)
+    cache.invalidate_task_stats(current_user.id)
+    await notify_clients(json.dumps({"type": "TASK_DELETED", "task_id": task_id}), current_user.id)
     return db_task
 
 @app.put("/tasks/{task_id}", response_model=schemas.Task)
-async def update_task(task_id: int, task: schemas.TaskUpdate, background_tasks: BackgroundTasks, db: Session = Depends(get_db), current_user: schemas.User = Depends(auth.get_current_user)):
-    db_task = crud.get_task(db, task_id=task_id)
+async def update_task(task_id: int, task: schemas.TaskUpdate, db: AsyncSession = Depends(get_async_db), current_user: schemas.User = Depends(auth.get_current_user)):
+    db_task = await crud.get_task_async(db, task_id=task_id)
     if db_task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     if db_task.owner_id != current_user.id:
          raise HTTPException(status_code=403, detail="Not authorized to update this task")
-    updated_task = crud.update_task(db=db, task_id=task_id, task=task)
-    
-    # WebSocket Broadcast
-    await notify_clients(json.dumps({"type": "TASK_UPDATED", "task": jsonable_encoder(updated_task)}))
-    
-    # Email Notification (e.g. on status change)
+    changed = crud.changed_fields(db_task, task)
+
+    # Email Notification (e.g. on status change), committed with the update
+    notification = None
     if task.status:
-         background_tasks.add_task(
-            send_email_notification, 
-            email=current_user.email, 
-            subject="Task Updated", 
-            message=f"The task '{updated_task.title}' status is now '{updated_task.status}'."
+        title = task.title if task.title is not None else db_task.title
+        notification = notifications.Notification(
+            current_user.email,
+            "Task Updated",
+            f"The task '{title}' status is now '{task.status}'."
+        )
+    updated_task = await crud.update_task_async(db, task_id=task_id, task=task, notification=notification)
+    notifications.outbox.wake()
+    cache.invalidate_task_stats(current_user.id)
+    
+    # WebSocket Broadcast: only the changed fields, merged with other updates to the task made shortly after
+    if changed:
+        task_updates.update(
+            realtime.user_channel(current_user.id),
+            updated_task.id,
+            updated_task.version,
+            jsonable_encoder({field: getattr(updated_task, field) for field in changed}),
         )
 
     return updated_task
@@ -246,8 +438,10 @@ if not os.path.exists(AVATAR_DIR):
 app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
 
 # Profile image upload
+# Plain def like the other sync-session routes: the commit can wait on the SQLite write
+# lock, which must happen in the threadpool rather than on the event loop
 @app.post("/users/me/avatar", response_model=schemas.User)
-async def upload_avatar(
+def upload_avatar(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_user)
@@ -278,10 +472,11 @@ async def upload_avatar(
     db_user.profile_image = image_url
     db.commit()
     db.refresh(db_user)
+    auth.invalidate_user(db_user.id)
     return db_user
 
 @app.post("/tasks/{task_id}/attachments/", response_model=schemas.Attachment)
-async def upload_file(task_id: int, file: UploadFile = File(...), db: Session = Depends(get_db), current_user: schemas.User = Depends(auth.get_current_user)):
+def upload_file(task_id: int, file: UploadFile = File(...), db: Session = Depends(get_db), current_user: schemas.User = Depends(auth.get_current_user)):
     file_path = os.path.join(UPLOAD_DIR, file.filename)
     with open(file_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
@@ -320,22 +515,53 @@ def delete_attachment(attachment_id: int, db: Session = Depends(get_db), current
     return {"detail": "Attachment deleted"}
 
 @app.get("/tasks/analytics/", response_model=schemas.TaskStats)
-def get_analytics(period: str = "week", db: Session = Depends(get_db), current_user: schemas.User = Depends(auth.get_current_user)):
-    return crud.get_task_stats(db, user_id=current_user.id, period=period)
+def get_analytics(period: str = "week", db: Session = Depends(get_primary_db), current_user: schemas.User = Depends(auth.get_current_user)):
+    return cache.analytics_cache.get_or_set(
+        cache.analytics_key(current_user.id, period),
+        lambda: crud.get_task_stats(db, user_id=current_user.id, period=period)
+    )
+
+# /metrics exposes cache, pool and queue internals: it is off unless METRICS_TOKEN is set,
+# and then only answers requests carrying that token (Authorization: Bearer <token>)
+METRICS_TOKEN = _os.environ.get("METRICS_TOKEN")
+
+def require_metrics_token(request: Request):
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid metrics token", headers={"WWW-Authenticate": "Bearer"})
+
+@app.get("/metrics", dependencies=[Depends(require_metrics_token)])
+def get_metrics():
+    return {
+        "analytics_cache": cache.analytics_cache.stats(),
+        "auth_cache": auth.user_cache.stats(),
+        "password_hashing": auth.password_hash_stats(),
+        "websocket": {**realtime.manager.stats(), "coalesced_updates": task_updates.merged},
+        "backplane": backplane.event_backplane.stats(),
+        "sqlite_writes": database.write_serializer.stats() if database.write_serializer else None,
+        "read_routing": database.read_router.stats(),
+        "notifications": notifications.outbox.stats(),
+        "database_pool": {
+            "sync": pooling.pool_stats(database.engine),
+            "async": pooling.pool_stats(database.async_engine.sync_engine),
+        },
+    }
 
 
 
 @app.post("/auth/forgot-password")
-async def forgot_password(email_data: schemas.EmailSchema, db: Session = Depends(get_db)):
+async def forgot_password(email_data: schemas.EmailSchema, db: AsyncSession = Depends(get_async_db)):
     # Check if user exists
-    user = crud.get_user_by_email(db, email=email_data.email)
+    user = await crud.get_user_by_email_async(db, email=email_data.email)
     if not user:
         # We return 404 here for simplicity
         raise HTTPException(status_code=404, detail="User not found")
     
     # Generate OTP (Fixed for demo or random)
     otp = "123456"
-    crud.set_reset_token(db, email=email_data.email, token=otp)
+    await crud.set_reset_token_async(db, email=email_data.email, token=otp)
     
     print(f"\n{'='*50}")
     print(f"EMAIL OTP FOR {email_data.email}: {otp}")
@@ -344,15 +570,16 @@ async def forgot_password(email_data: schemas.EmailSchema, db: Session = Depends
     return {"message": "OTP sent to email", "dev_otp": otp}
 
 @app.post("/auth/reset-password")
-async def reset_password(reset_data: schemas.PasswordResetConfirm, db: Session = Depends(get_db)):
-    user = crud.get_user_by_email(db, email=reset_data.email)
+async def reset_password(reset_data: schemas.PasswordResetConfirm, db: AsyncSession = Depends(get_async_db)):
+    user = await crud.get_user_by_email_async(db, email=reset_data.email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
         
     if user.reset_token != reset_data.otp:
         raise HTTPException(status_code=400, detail="Invalid OTP")
     
-    crud.complete_password_reset(db, user=user, new_password=reset_data.new_password)
+    hashed_password = await auth.get_password_hash_async(reset_data.new_password)
+    await crud.complete_password_reset_async(db, user=user, hashed_password=hashed_password)
     return {"message": "Password reset successfully"}
 
 
@@ -390,54 +617,73 @@ async def verify_otp(otp_data: OTPVerify):
 
 
 from fastapi import WebSocket, WebSocketDisconnect
-
-# WebSocket Connection Manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
+from realtime import manager
+import asyncio
+
+# Close code 1008 = policy violation
+WS_AUTH_FAILED = 1008
+
+@app.websocket("/ws")
+@app.websocket("/ws/{client_id}")  # older clients; the id in the path is ignored
+async def websocket_endpoint(websocket: WebSocket, token: str = None, since: int = None, epoch: str = None):
+    # Browsers cannot set headers on a WebSocket, so the JWT comes as ?token=; other clients may send a Bearer header
+    if token is None:
+        scheme, _, credentials = websocket.headers.get("authorization", "").partition(" ")
+        token = credentials if scheme.lower() == "bearer" else None
+    user = await run_in_threadpool(auth.user_from_token, token)
+    if user is None:
+        # Accept first so browsers see the close code (a rejected handshake only shows up as 1006)
         await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except:
-                self.disconnect(connection)
-
-manager = ConnectionManager()
+        await websocket.close(code=WS_AUTH_FAILED)
+        return
 
-@app.websocket("/ws/{client_id}")
-async def websocket_endpoint(websocket: WebSocket, client_id: int):
-    await manager.connect(websocket)
+    # Reconnecting clients pass the seq/epoch of the last event they saw to get what they missed
+    await manager.connect(websocket, [realtime.user_channel(user.id)], since=since, epoch=epoch)
     try:
         while True:
-            data = await websocket.receive_text()
-            # process client messages if needed
-            # await manager.broadcast(f"Client #{client_id} says: {data}")
+            # Any message (the client's heartbeat replies included) marks the connection as alive
+            await websocket.receive_text()
+            manager.touch(websocket)
     except WebSocketDisconnect:
+        pass
+    finally:
+        # Also covers sockets the server closed itself (reaped or overflowing)
         manager.disconnect(websocket)
-        # await manager.broadcast(f"Client #{client_id} left the chat")
-
-# Trigger broadcast on task events (Helper)
-async def notify_clients(message: str):
-    await manager.broadcast(message)
-
-
-# Email Simulation (Background Task)
-def send_email_notification(email: str, subject: str, message: str):
-    import time
-    time.sleep(1) # Simulate network delay
-    print(f"\n{'='*20} EMAIL NOTIFICATION {'='*20}")
-    print(f"To: {email}")
-    print(f"Subject: {subject}")
-    print(f"Message: {message}")
-    print(f"{'='*60}\n")
+
+@app.on_event("startup")
+async def start_backplane():
+    # Events published by other workers are delivered to this worker's sockets
+    backplane.event_backplane.start(asyncio.get_running_loop(), manager.publish)
+
+@app.on_event("shutdown")
+def stop_backplane():
+    backplane.event_backplane.stop()
+
+@app.on_event("startup")
+async def start_outbox():
+    notifications.outbox.start()
+
+@app.on_event("shutdown")
+async def stop_outbox():
+    await notifications.outbox.stop()
+
+def _publish(channel: str, message: str):
+    # Only enqueues; each connection's writer task (and the backplane's thread) does the sending
+    manager.publish(channel, message)
+    backplane.event_backplane.publish(channel, message)
+
+task_updates = realtime.UpdateCoalescer(_publish)
+
+# Trigger task events for the user's subscribers (Helper)
+async def notify_clients(message: str, user_id: int):
+    task_updates.publish(realtime.user_channel(user_id), message)
+
+
+# Email notifications (Background Task)
+async def send_email_notification(email: str, subject: str, message: str):
+    # Queued in the outbox in a transaction of its own; task writes stage theirs in the
+    # write's transaction instead (the notification argument of the crud.*_async writes)
+    await notifications.outbox.enqueue(email, subject, message)
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Enum, Float
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Date, Enum, Float, Index, Text
 from sqlalchemy.orm import relationship
 from database import Base
 import datetime
@@ -41,11 +41,20 @@ class Task(Base):
     time_spent = Column(Float, default=0.0)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     owner_id = Column(Integer, ForeignKey("users.id"))
+    # Bumped by the crud updaters (crud.bump_version); WebSocket diffs carry it so clients can order them
+    version = Column(Integer, default=1, nullable=False, server_default="1")
 
     owner = relationship("User", back_populates="tasks")
     comments = relationship("Comment", back_populates="task", cascade="all, delete-orphan")
     attachments = relationship("Attachment", back_populates="task", cascade="all, delete-orphan")
 
+    # Composite indexes backing the keyset (cursor) sorts of GET /tasks/
+    __table_args__ = (
+        Index("ix_tasks_owner_created_at", "owner_id", "created_at", "id"),
+        Index("ix_tasks_owner_due_date", "owner_id", "due_date", "id"),
+        Index("ix_tasks_owner_priority", "owner_id", "priority", "id"),
+    )
+
 class Comment(Base):
     __tablename__ = "comments"
 
@@ -68,3 +77,55 @@ class Attachment(Base):
     task_id = Column(Integer, ForeignKey("tasks.id"))
 
     task = relationship("Task", back_populates="attachments")
+
+class UserActivityStreak(Base):
+    __tablename__ = "user_activity_streaks"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    streak = Column(Integer, default=0)
+    last_active_date = Column(Date, nullable=True)
+
+class TaskDailyRollup(Base):
+    __tablename__ = "task_daily_rollups"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    hour = Column(Integer, primary_key=True)
+    task_count = Column(Integer, default=0, nullable=False)
+    todo_count = Column(Integer, default=0, nullable=False)
+    in_progress_count = Column(Integer, default=0, nullable=False)
+    done_count = Column(Integer, default=0, nullable=False)
+    low_count = Column(Integer, default=0, nullable=False)
+    medium_count = Column(Integer, default=0, nullable=False)
+    high_count = Column(Integer, default=0, nullable=False)
+    time_spent = Column(Float, default=0.0, nullable=False)
+
+class RealtimeEvent(Base):
+    """WebSocket events relayed between workers by the polling backplane (and oversized Postgres NOTIFYs)."""
+    __tablename__ = "realtime_events"
+    # AUTOINCREMENT so ids are never reused after old rows are pruned
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True, index=True)
+    origin = Column(String, nullable=False)
+    channel = Column(String, nullable=False)
+    message = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+class NotificationOutbox(Base):
+    """Emails waiting to be delivered by the notifications worker (pending -> sent | failed)."""
+    __tablename__ = "notification_outbox"
+    __table_args__ = (Index("ix_notification_outbox_due", "status", "next_attempt_at"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    recipient = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    status = Column(String, default="pending", nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+    # Set by the worker that is sending the row; the lease ends at next_attempt_at
+    claimed_by = Column(String, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
@@ -0,0 +1,294 @@
+"""
+Email notifications through a persistent outbox.
+
+Task writes stage a row in notification_outbox inside their own transaction (see
+OutboxWorker.add), so a notification exists exactly when the change it reports was
+committed. An async worker on the event loop drains due rows in batches and delivers
+each batch over a single SMTP connection (in a thread, as smtplib blocks), so request
+threads never wait on mail delivery. Without SMTP_HOST, messages are printed to the
+console instead.
+
+Failed deliveries are retried with exponential backoff by moving next_attempt_at
+forward, and marked failed after OUTBOX_MAX_ATTEMPTS. Rows survive restarts: a worker
+claims a batch by stamping it with its id and a lease (next_attempt_at), so if the
+process dies mid-send the rows become due again once the lease runs out and another
+worker (or the restarted one) picks them up. Delivery is at least once. The claim and
+the recording of results are separate short transactions; no session or write lock is
+held while the mailer talks to the SMTP server.
+
+With NOTIFY_DIGEST_SECONDS set, a notification waits that long before it is due, and
+when it is sent every other pending notification for the same recipient goes with it
+as one summary email, so a burst of task edits becomes a single message.
+"""
+import asyncio
+import os
+import smtplib
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import select, update
+
+import database, models
+
+SMTP_HOST = os.environ.get("SMTP_HOST")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", "587"))
+SMTP_USERNAME = os.environ.get("SMTP_USERNAME")
+SMTP_PASSWORD = os.environ.get("SMTP_PASSWORD")
+SMTP_STARTTLS = os.environ.get("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes")
+SMTP_FROM = os.environ.get("SMTP_FROM", "TaskFlow <no-reply@taskflow.local>")
+SMTP_TIMEOUT = float(os.environ.get("SMTP_TIMEOUT", "10"))
+
+BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", "50"))
+POLL_INTERVAL = float(os.environ.get("OUTBOX_POLL_INTERVAL", "5"))
+MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "8"))
+RETRY_BASE = float(os.environ.get("OUTBOX_RETRY_BASE", "30"))
+RETRY_MAX = 3600.0
+# How long a claimed batch may take before other workers consider it abandoned
+LEASE = timedelta(seconds=float(os.environ.get("OUTBOX_LEASE_SECONDS", "300")))
+# 0 sends every notification on its own
+DIGEST_WINDOW = float(os.environ.get("NOTIFY_DIGEST_SECONDS", "0"))
+
+Outbox = models.NotificationOutbox
+
+
+class Notification(NamedTuple):
+    recipient: str
+    subject: str
+    body: str
+
+
+class ConsoleMailer:
+    """Prints messages; used when no SMTP server is configured."""
+
+    def send_batch(self, messages: List[EmailMessage]) -> List[Optional[str]]:
+        for message in messages:
+            print(f"\n{'='*20} EMAIL NOTIFICATION {'='*20}")
+            print(f"To: {message['To']}")
+            print(f"Subject: {message['Subject']}")
+            print(f"Message: {message.get_content().rstrip()}")
+            print(f"{'='*60}\n")
+        return [None] * len(messages)
+
+
+class SMTPMailer:
+    def __init__(self, host: str, port: int = SMTP_PORT, username: str = SMTP_USERNAME, password: str = SMTP_PASSWORD,
+                 starttls: bool = SMTP_STARTTLS, timeout: float = SMTP_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.connections = 0
+
+    def send_batch(self, messages: List[EmailMessage]) -> List[Optional[str]]:
+        """Send `messages` over one connection; returns an error (or None) per message."""
+        results: List[Optional[str]] = []
+        try:
+            with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+                self.connections += 1
+                if self.starttls:
+                    smtp.starttls()
+                if self.username:
+                    smtp.login(self.username, self.password)
+                for message in messages:
+                    try:
+                        smtp.send_message(message)
+                        results.append(None)
+                    except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                        # Rejected by the server; the connection is still usable
+                        results.append(f"{type(e).__name__}: {e}")
+        except (OSError, smtplib.SMTPException) as e:
+            # Connection-level failure: whatever wasn't sent is retried
+            results.extend([f"{type(e).__name__}: {e}"] * (len(messages) - len(results)))
+        return results
+
+
+def create_mailer():
+    return SMTPMailer(SMTP_HOST) if SMTP_HOST else ConsoleMailer()
+
+
+def build_message(row: Outbox) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = SMTP_FROM
+    message["To"] = row.recipient
+    message["Subject"] = row.subject
+    message.set_content(row.body)
+    return message
+
+
+def build_digest(rows: List[Outbox]) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = SMTP_FROM
+    message["To"] = rows[0].recipient
+    message["Subject"] = f"{len(rows)} task notifications"
+    sections = [f"{row.subject}\n{'-' * len(row.subject)}\n{row.body}" for row in rows]
+    message.set_content("Here is what happened since the last update:\n\n" + "\n\n".join(sections))
+    return message
+
+
+def retry_delay(attempts: int) -> float:
+    return min(RETRY_MAX, RETRY_BASE * 2 ** (attempts - 1))
+
+
+class OutboxWorker:
+    def __init__(self, mailer=None, session_factory=None, batch_size: int = BATCH_SIZE, poll_interval: float = POLL_INTERVAL,
+                 max_attempts: int = MAX_ATTEMPTS, digest_window: float = DIGEST_WINDOW):
+        self.mailer = mailer or create_mailer()
+        # None: whatever database.AsyncSessionLocal is when the worker runs
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.digest_window = digest_window
+        self._task = None
+        self._wake = None
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.batches = 0
+        self.errors = 0
+        self.digests = 0
+        # Notifications folded into another one's digest, i.e. emails not sent
+        self.collapsed = 0
+
+    def _session(self):
+        return (self.session_factory or database.AsyncSessionLocal)()
+
+    def add(self, db, notification: Notification):
+        """Stage `notification` in `db`'s transaction; call wake() once that has committed."""
+        due = datetime.utcnow() + timedelta(seconds=self.digest_window)
+        db.add(Outbox(recipient=notification.recipient, subject=notification.subject, body=notification.body, next_attempt_at=due))
+
+    async def enqueue(self, recipient: str, subject: str, body: str):
+        """Queue a notification in a transaction of its own."""
+        async with self._session() as db:
+            self.add(db, Notification(recipient, subject, body))
+            await db.commit()
+        self.wake()
+
+    def wake(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    def start(self):
+        self._wake = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                delivered = await self.drain()
+            except Exception as e:
+                self.errors += 1
+                print(f"[OUTBOX] Worker error: {e}")
+                delivered = 0
+            if delivered < self.batch_size:
+                # Caught up: sleep until the next poll, or until something is enqueued
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _claim(self, db) -> List[Outbox]:
+        now = datetime.utcnow()
+        due = (
+            select(Outbox.id)
+            .where(Outbox.status == "pending", Outbox.next_attempt_at <= now)
+            .order_by(Outbox.next_attempt_at, Outbox.id)
+            .limit(self.batch_size)
+        )
+        ids = (await db.execute(due)).scalars().all()
+        if not ids:
+            return []
+        claim = uuid.uuid4().hex
+        # Conditional on still being due, so rows another worker claimed in between are skipped
+        await db.execute(
+            update(Outbox)
+            .where(Outbox.id.in_(ids), Outbox.status == "pending", Outbox.next_attempt_at <= now)
+            .values(claimed_by=claim, next_attempt_at=now + LEASE, attempts=Outbox.attempts + 1)
+        )
+        if self.digest_window:
+            # Everything else waiting for these recipients goes out in the same digest
+            recipients = select(Outbox.recipient).where(Outbox.claimed_by == claim).distinct()
+            await db.execute(
+                update(Outbox)
+                .where(Outbox.recipient.in_(recipients), Outbox.status == "pending", Outbox.claimed_by.is_(None))
+                .values(claimed_by=claim, next_attempt_at=now + LEASE, attempts=Outbox.attempts + 1)
+            )
+        await db.commit()
+        return (await db.execute(select(Outbox).where(Outbox.claimed_by == claim).order_by(Outbox.id))).scalars().all()
+
+    async def drain(self) -> int:
+        """Deliver one batch of due messages; returns how many rows were attempted."""
+        async with self._session() as db:
+            rows = await self._claim(db)
+        if not rows:
+            return 0
+        self.batches += 1
+        groups = self._group(rows)
+        messages = [build_message(group[0]) if len(group) == 1 else build_digest(group) for group in groups]
+        results = await asyncio.to_thread(self.mailer.send_batch, messages)
+        now = datetime.utcnow()
+        async with self._session() as db:
+            for group, error in zip(groups, results):
+                if error is None and len(group) > 1:
+                    self.digests += 1
+                    self.collapsed += len(group) - 1
+                for row in group:
+                    # Still ours unless the lease ran out and another worker took the row over
+                    await db.execute(
+                        update(Outbox)
+                        .where(Outbox.id == row.id, Outbox.claimed_by == row.claimed_by)
+                        .values(**self._result(row, error, now))
+                    )
+            await db.commit()
+        return len(rows)
+
+    def _group(self, rows: List[Outbox]) -> List[List[Outbox]]:
+        if not self.digest_window:
+            return [[row] for row in rows]
+        groups = defaultdict(list)
+        for row in rows:
+            groups[row.recipient].append(row)
+        return list(groups.values())
+
+    def _result(self, row: Outbox, error: Optional[str], now: datetime) -> dict:
+        if error is None:
+            self.sent += 1
+            return {"claimed_by": None, "status": "sent", "sent_at": now, "last_error": None}
+        if row.attempts >= self.max_attempts:
+            self.failed += 1
+            return {"claimed_by": None, "status": "failed", "last_error": error}
+        self.retried += 1
+        return {"claimed_by": None, "next_attempt_at": now + timedelta(seconds=retry_delay(row.attempts)), "last_error": error}
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "mailer": type(self.mailer).__name__,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "batches": self.batches,
+            "errors": self.errors,
+            "digest_window": self.digest_window,
+            "digests": self.digests,
+            "collapsed": self.collapsed,
+        }
+
+
+outbox = OutboxWorker()
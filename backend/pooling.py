@@ -0,0 +1,130 @@
+"""
+Connection pool settings and instrumentation for the server database (Postgres).
+
+Pool size, overflow, recycle, pre-ping, checkout timeout and the per-statement timeout
+come from the environment. Every worker process has two pools, one behind the sync
+engine and one behind the async engine, so a deployment may open up to
+workers x 2 x (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections; keep that below the
+server's max_connections.
+
+The pools record how long each checkout took in a histogram, along with checkouts
+that timed out, and report live checked-out / overflow counts. /metrics exposes them
+so the pool can be sized per worker: waits in the upper buckets mean it is too small,
+an idle pool that never overflows means it can shrink.
+"""
+import os
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Seconds; below the idle timeout of the server or proxy in front of it
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "300"))
+# Test connections on checkout, so ones closed by the server while idle are replaced
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# 0 disables it
+STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class WaitHistogram:
+    """Counts of checkout times per bucket (upper bounds in ms), plus totals."""
+
+    def __init__(self, buckets=WAIT_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, ms: float, timed_out: bool = False):
+        index = next((i for i, bound in enumerate(self.buckets) if ms <= bound), len(self.buckets))
+        with self._lock:
+            self.counts[index] += 1
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.total_ms += ms
+            self.max_ms = max(self.max_ms, ms)
+
+    def stats(self) -> dict:
+        labels = [f"<={bound}ms" for bound in self.buckets] + [f">{self.buckets[-1]}ms"]
+        return {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "avg_ms": round(self.total_ms / self.checkouts, 3) if self.checkouts else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "histogram": dict(zip(labels, self.counts)),
+        }
+
+
+class _InstrumentedPool:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waits = WaitHistogram()
+
+    def connect(self):
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            self.waits.observe((time.perf_counter() - start) * 1000, timed_out)
+
+    def recreate(self):
+        # Happens on dispose and after a disconnect; keep the history
+        pool = super().recreate()
+        pool.waits = self.waits
+        return pool
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "checked_in": self.checkedin(),
+            # overflow() counts up from -size; only the positive part are extra connections
+            "overflow": max(0, self.overflow()),
+            "max_overflow": self._max_overflow,
+            "checkout_ms": self.waits.stats(),
+        }
+
+
+class InstrumentedQueuePool(_InstrumentedPool, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPool, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_args(asynchronous: bool = False) -> dict:
+    """create_engine / create_async_engine keyword arguments for the Postgres engines."""
+    connect_args = {}
+    if STATEMENT_TIMEOUT_MS:
+        if asynchronous:
+            connect_args["server_settings"] = {"statement_timeout": str(STATEMENT_TIMEOUT_MS)}
+        else:
+            connect_args["options"] = f"-c statement_timeout={STATEMENT_TIMEOUT_MS}"
+    return {
+        "poolclass": InstrumentedAsyncQueuePool if asynchronous else InstrumentedQueuePool,
+        "pool_size": POOL_SIZE,
+        "max_overflow": MAX_OVERFLOW,
+        "pool_recycle": POOL_RECYCLE,
+        "pool_pre_ping": POOL_PRE_PING,
+        "pool_timeout": POOL_TIMEOUT,
+        "connect_args": connect_args,
+    }
+
+
+def pool_stats(engine):
+    pool = engine.pool
+    return pool.stats() if isinstance(pool, _InstrumentedPool) else None
@@ -0,0 +1,310 @@
+"""
+WebSocket connection registry and event fan-out.
+
+Connections subscribe to channels ("user:<id>", later "project:<id>") and the manager
+keeps an index from channel to its connections, so publishing an event costs
+O(subscribers of that channel) instead of O(every open socket), and users only ever
+receive events about their own tasks.
+
+Publishing never awaits a socket: each connection has a bounded send queue drained by
+its own writer task, so a slow client cannot stall other clients or the HTTP request
+that produced the event. When a queue overflows the client is sent a RESYNC (it has
+missed events and should refetch), and if it is still behind after that it is dropped.
+
+Every event delivered by this process is numbered (`seq`) and kept in a bounded ring
+buffer. Sequence numbers are per process, identified by a random `epoch`, so a client
+that reconnects with ?since=<seq>&epoch=<epoch> is replayed what it missed, or sent
+a RESYNC if it comes back to another process (or after a restart) or the buffer no
+longer reaches back far enough.
+
+TASK_UPDATED events carry only the changed fields and the task's new version.
+Updates to the same task within WS_COALESCE_MS are merged into one event before
+they are published; any other event on the channel flushes pending updates first,
+so clients still see events in order.
+
+A heartbeat task sends every connection a PING each WS_PING_INTERVAL seconds and
+reaps connections that have not sent anything (clients answer PING with a pong)
+for WS_IDLE_TIMEOUT seconds, so half-open sockets do not linger in the index.
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import defaultdict, deque
+from typing import Dict, Iterable, List, Optional, Set
+
+from fastapi import WebSocket
+
+SEND_QUEUE_SIZE = int(os.environ.get("WS_SEND_QUEUE_SIZE", "256"))
+# "resync": replace the backlog with a RESYNC message first; "drop": disconnect straight away
+OVERFLOW_POLICY = os.environ.get("WS_OVERFLOW_POLICY", "resync")
+# Close code 1013 = "try again later"
+OVERFLOW_CLOSE_CODE = 1013
+CLOSE_TIMEOUT = 5.0
+REPLAY_BUFFER_SIZE = int(os.environ.get("WS_REPLAY_BUFFER", "10000"))
+COALESCE_WINDOW = float(os.environ.get("WS_COALESCE_MS", "100")) / 1000
+PING_INTERVAL = float(os.environ.get("WS_PING_INTERVAL", "25"))
+IDLE_TIMEOUT = float(os.environ.get("WS_IDLE_TIMEOUT", "60"))
+# Close code 1001 = "going away"
+IDLE_CLOSE_CODE = 1001
+
+PING_MESSAGE = json.dumps({"type": "PING"})
+
+
+def user_channel(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def _with_seq(message: str, seq: int) -> str:
+    # Events are JSON objects; splice the number in rather than re-serializing the payload
+    return f'{{"seq": {seq}, {message[1:]}' if message != "{}" else f'{{"seq": {seq}}}'
+
+
+class EventLog:
+    """Bounded ring buffer of recently delivered events, numbered within this process's epoch."""
+
+    def __init__(self, size: int = REPLAY_BUFFER_SIZE):
+        self.epoch = uuid.uuid4().hex[:12]
+        self.seq = 0
+        self.events = deque(maxlen=size)
+
+    def append(self, channel: str, message: str) -> str:
+        self.seq += 1
+        message = _with_seq(message, self.seq)
+        self.events.append((self.seq, channel, message))
+        return message
+
+    def since(self, seq: int, channels: Set[str]) -> Optional[List[str]]:
+        """Events on `channels` after `seq`, or None if some of them are no longer buffered."""
+        if seq > self.seq:
+            return None
+        oldest = self.events[0][0] if self.events else self.seq + 1
+        if seq < oldest - 1:
+            return None
+        missed = []
+        for event_seq, channel, message in reversed(self.events):
+            if event_seq <= seq:
+                break
+            if channel in channels:
+                missed.append(message)
+        missed.reverse()
+        return missed
+
+
+class Connection:
+    """A socket, its channels and its outgoing queue."""
+
+    def __init__(self, websocket: WebSocket, queue_size: int = SEND_QUEUE_SIZE):
+        self.websocket = websocket
+        self.channels: Set[str] = set()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.resync_message = None
+        self.writer = None
+        self.last_seen = time.monotonic()
+
+    def enqueue(self, message: str) -> bool:
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    @property
+    def resync_pending(self) -> bool:
+        return self.resync_message is not None
+
+    def resync(self, message: str):
+        # Everything queued is superseded by the refetch the client is about to do
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+        self.resync_message = message
+
+
+class ConnectionManager:
+    def __init__(self, queue_size: int = SEND_QUEUE_SIZE, overflow_policy: str = OVERFLOW_POLICY, replay_buffer_size: int = REPLAY_BUFFER_SIZE,
+                 ping_interval: float = PING_INTERVAL, idle_timeout: float = IDLE_TIMEOUT):
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self._heartbeat = None
+        self.log = EventLog(replay_buffer_size)
+        self.channels: Dict[str, Set[Connection]] = defaultdict(set)
+        self.connections: Dict[WebSocket, Connection] = {}
+        self.dropped = 0
+        self.resyncs = 0
+        self.replayed = 0
+        self.reaped = 0
+
+    @property
+    def connection_count(self) -> int:
+        return len(self.connections)
+
+    async def connect(self, websocket: WebSocket, channels: Iterable[str], since: int = None, epoch: str = None):
+        await websocket.accept()
+        connection = Connection(websocket, self.queue_size)
+        self.connections[websocket] = connection
+        self.subscribe(websocket, channels)
+        # No await from here on: nothing can be published between the snapshot and the replay
+        connection.enqueue(json.dumps({"type": "CONNECTED", "epoch": self.log.epoch, "seq": self.log.seq}))
+        if since is not None:
+            missed = self.log.since(since, connection.channels) if epoch == self.log.epoch else None
+            if missed is None or len(missed) >= self.queue_size:
+                self.resyncs += 1
+                connection.resync(self._resync_message())
+            else:
+                self.replayed += len(missed)
+                for message in missed:
+                    connection.enqueue(message)
+        connection.writer = asyncio.create_task(self._write(connection))
+        self._ensure_heartbeat()
+        return connection
+
+    def subscribe(self, websocket: WebSocket, channels: Iterable[str]):
+        connection = self.connections[websocket]
+        for channel in channels:
+            self.channels[channel].add(connection)
+            connection.channels.add(channel)
+
+    def disconnect(self, websocket: WebSocket):
+        connection = self.connections.pop(websocket, None)
+        if connection is None:
+            return
+        for channel in connection.channels:
+            subscribers = self.channels.get(channel)
+            if subscribers is None:
+                continue
+            subscribers.discard(connection)
+            if not subscribers:
+                del self.channels[channel]
+        if connection.writer is not None and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+
+    def touch(self, websocket: WebSocket):
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            connection.last_seen = time.monotonic()
+
+    def publish(self, channel: str, message: str) -> int:
+        """Number and log `message`, then queue it for every subscriber of `channel`; returns how many accepted it."""
+        message = self.log.append(channel, message)
+        delivered = 0
+        # Iterate over a copy: overflowing connections are removed from the index as we go
+        for connection in list(self.channels.get(channel, ())):
+            if connection.enqueue(message):
+                delivered += 1
+            else:
+                self._overflow(connection)
+        return delivered
+
+    def _overflow(self, connection: Connection):
+        if self.overflow_policy == "resync" and not connection.resync_pending:
+            self.resyncs += 1
+            connection.resync(self._resync_message())
+            return
+        self.dropped += 1
+        self.disconnect(connection.websocket)
+        asyncio.create_task(self._close(connection.websocket, OVERFLOW_CLOSE_CODE))
+
+    async def _write(self, connection: Connection):
+        try:
+            while True:
+                message = await connection.queue.get()
+                await connection.websocket.send_text(message)
+                if message is connection.resync_message:
+                    connection.resync_message = None
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.disconnect(connection.websocket)
+
+    def _ensure_heartbeat(self):
+        if not self.ping_interval:
+            return
+        loop = asyncio.get_running_loop()
+        if self._heartbeat is None or self._heartbeat.done() or self._heartbeat.get_loop() is not loop:
+            self._heartbeat = loop.create_task(self._run_heartbeat())
+
+    async def _run_heartbeat(self):
+        while self.connections:
+            await asyncio.sleep(self.ping_interval)
+            self.heartbeat()
+
+    def heartbeat(self):
+        """Reap connections idle for longer than idle_timeout, then ping the rest."""
+        deadline = time.monotonic() - self.idle_timeout
+        for connection in list(self.connections.values()):
+            if connection.last_seen < deadline:
+                self.reaped += 1
+                self.disconnect(connection.websocket)
+                asyncio.create_task(self._close(connection.websocket, IDLE_CLOSE_CODE))
+            elif not connection.resync_pending:
+                # A full queue means the client is behind anyway; the overflow handling deals with it
+                connection.enqueue(PING_MESSAGE)
+
+    def _resync_message(self) -> str:
+        # Events up to `seq` are covered by the refetch; the client continues from there
+        return json.dumps({"type": "RESYNC", "epoch": self.log.epoch, "seq": self.log.seq})
+
+    async def _close(self, websocket: WebSocket, code: int):
+        try:
+            await asyncio.wait_for(websocket.close(code=code), CLOSE_TIMEOUT)
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        return {
+            "connections": self.connection_count,
+            "channels": len(self.channels),
+            "queued_messages": sum(connection.queue.qsize() for connection in self.connections.values()),
+            "resyncs": self.resyncs,
+            "dropped": self.dropped,
+            "replayed": self.replayed,
+            "reaped": self.reaped,
+            "epoch": self.log.epoch,
+            "seq": self.log.seq,
+        }
+
+
+class UpdateCoalescer:
+    """Merges TASK_UPDATED diffs for the same task made within `window` seconds, then hands them to `sink`."""
+
+    def __init__(self, sink, window: float = COALESCE_WINDOW):
+        self.sink = sink
+        self.window = window
+        # channel -> task id -> pending event, in first-update order
+        self.pending: Dict[str, Dict[int, dict]] = {}
+        self._timers = {}
+        self.merged = 0
+
+    def update(self, channel: str, task_id: int, version: int, changes: dict):
+        event = {"type": "TASK_UPDATED", "task_id": task_id, "version": version, "changes": changes}
+        if self.window <= 0:
+            self.sink(channel, json.dumps(event))
+            return
+        updates = self.pending.setdefault(channel, {})
+        if task_id in updates:
+            self.merged += 1
+            updates[task_id]["changes"].update(changes)
+            updates[task_id]["version"] = max(updates[task_id]["version"], version)
+        else:
+            updates[task_id] = event
+        if channel not in self._timers:
+            self._timers[channel] = asyncio.get_running_loop().call_later(self.window, self.flush, channel)
+
+    def publish(self, channel: str, message: str):
+        """Publish any other event, after the channel's pending updates."""
+        self.flush(channel)
+        self.sink(channel, message)
+
+    def flush(self, channel: str):
+        timer = self._timers.pop(channel, None)
+        if timer is not None:
+            timer.cancel()
+        for event in self.pending.pop(channel, {}).values():
+            self.sink(channel, json.dumps(event))
+
+
+manager = ConnectionManager()
@@ -0,0 +1,135 @@
+"""
+Per-user hourly task rollups (task_daily_rollups) backing the analytics activity charts.
+
+Each task contributes to the bucket of the hour it was created in. The crud task
+writers keep the buckets in step inside their own transaction, so analytics reads
+a bounded number of rollup rows instead of re-aggregating the tasks table.
+"""
+from collections import defaultdict
+
+from sqlalchemy import Integer, cast, extract, func, case, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+import models
+
+Rollup = models.TaskDailyRollup
+
+STATUS_COLUMNS = {
+    models.TaskStatus.TODO: "todo_count",
+    models.TaskStatus.IN_PROGRESS: "in_progress_count",
+    models.TaskStatus.DONE: "done_count",
+}
+PRIORITY_COLUMNS = {
+    models.TaskPriority.LOW: "low_count",
+    models.TaskPriority.MEDIUM: "medium_count",
+    models.TaskPriority.HIGH: "high_count",
+}
+COUNTER_COLUMNS = ["task_count", *STATUS_COLUMNS.values(), *PRIORITY_COLUMNS.values(), "time_spent"]
+
+
+def snapshot(task) -> dict:
+    """The task fields a rollup bucket depends on, captured before a mutation."""
+    return {
+        "owner_id": task.owner_id,
+        "created_at": task.created_at,
+        "status": task.status,
+        "priority": task.priority,
+        "time_spent": task.time_spent,
+    }
+
+
+def contribution(fields: dict, sign: int = 1) -> dict:
+    deltas = {"task_count": sign, "time_spent": sign * float(fields.get("time_spent") or 0.0)}
+    status_column = STATUS_COLUMNS.get(fields.get("status"))
+    if status_column:
+        deltas[status_column] = sign
+    priority_column = PRIORITY_COLUMNS.get(fields.get("priority"))
+    if priority_column:
+        deltas[priority_column] = sign
+    return deltas
+
+
+def apply(db: Session, user_id: int, created_at, deltas: dict):
+    """Add `deltas` to the bucket of `created_at`, creating the bucket if needed."""
+    deltas = {column: value for column, value in deltas.items() if value}
+    if not deltas:
+        return
+    key = {"user_id": user_id, "day": created_at.date(), "hour": created_at.hour}
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        upsert = (sqlite_insert if dialect == "sqlite" else pg_insert)(Rollup).values(**key, **_with_zeros(deltas))
+        upsert = upsert.on_conflict_do_update(
+            index_elements=[Rollup.user_id, Rollup.day, Rollup.hour],
+            set_={column: getattr(Rollup, column) + upsert.excluded[column] for column in deltas},
+        )
+        db.execute(upsert)
+        return
+
+    row = db.get(Rollup, (key["user_id"], key["day"], key["hour"]))
+    if row is None:
+        row = Rollup(**key, **_with_zeros({}))
+        db.add(row)
+    for column, value in deltas.items():
+        setattr(row, column, getattr(row, column) + value)
+
+
+def add_task(db: Session, task):
+    apply(db, task.owner_id, task.created_at, contribution(snapshot(task)))
+
+
+def remove_task(db: Session, task):
+    apply(db, task.owner_id, task.created_at, contribution(snapshot(task), sign=-1))
+
+
+def replacement(before: dict, task) -> dict:
+    """Deltas moving a task's contribution from its `before` snapshot to its current values."""
+    deltas = contribution(snapshot(task))
+    for column, value in contribution(before, sign=-1).items():
+        deltas[column] = deltas.get(column, 0) + value
+    return deltas
+
+
+def replace_task(db: Session, before: dict, task):
+    apply(db, task.owner_id, task.created_at, replacement(before, task))
+
+
+def apply_many(db: Session, user_id: int, changes):
+    """Apply (created_at, deltas) pairs with one upsert per hour bucket instead of one per task."""
+    buckets = defaultdict(lambda: defaultdict(int))
+    for created_at, deltas in changes:
+        bucket = buckets[created_at.replace(minute=0, second=0, microsecond=0)]
+        for column, value in deltas.items():
+            bucket[column] += value
+    for created_at, deltas in buckets.items():
+        apply(db, user_id, created_at, deltas)
+    return list(buckets)
+
+
+def backfill(db: Session, user_id: int = None):
+    """Rebuild rollups from the tasks table (all users, or one user). The caller commits."""
+    delete = db.query(Rollup)
+    tasks = select(models.Task)
+    if user_id is not None:
+        delete = delete.filter(Rollup.user_id == user_id)
+        tasks = tasks.where(models.Task.owner_id == user_id)
+    delete.delete(synchronize_session=False)
+
+    day = func.date(models.Task.created_at)
+    hour = cast(extract('hour', models.Task.created_at), Integer)
+    counters = [func.count(models.Task.id)]
+    for status in STATUS_COLUMNS:
+        counters.append(func.sum(case((models.Task.status == status, 1), else_=0)))
+    for priority in PRIORITY_COLUMNS:
+        counters.append(func.sum(case((models.Task.priority == priority, 1), else_=0)))
+    counters.append(func.coalesce(func.sum(models.Task.time_spent), 0.0))
+
+    aggregated = tasks.with_only_columns(models.Task.owner_id, day, hour, *counters).where(
+        models.Task.created_at.is_not(None)
+    ).group_by(models.Task.owner_id, day, hour)
+    db.execute(insert(Rollup).from_select(["user_id", "day", "hour", *COUNTER_COLUMNS], aggregated))
+
+
+def _with_zeros(deltas: dict) -> dict:
+    return {column: deltas.get(column, 0) for column in COUNTER_COLUMNS}
@@ -84,6 +84,10 @@ class Task(TaskBase):
     id: int
     created_at: datetime
     owner_id: int
+    version: int = 1
+    # The columns are nullable and TaskUpdate can clear them
+    status: Optional[TaskStatus] = TaskStatus.TODO
+    priority: Optional[TaskPriority] = TaskPriority.MEDIUM
     owner: User
     comments: List[Comment] = []
     attachments: List[Attachment] = []
@@ -91,6 +95,54 @@ class Task(TaskBase):
     class Config:
         from_attributes = True
 
+class TaskSummary(TaskBase):
+    id: int
+    created_at: datetime
+    owner_id: int
+    version: int = 1
+    # The columns are nullable and TaskUpdate can clear them
+    status: Optional[TaskStatus] = TaskStatus.TODO
+    priority: Optional[TaskPriority] = TaskPriority.MEDIUM
+    comment_count: int
+    attachment_count: int
+
+    class Config:
+        from_attributes = True
+
+class TaskPage(BaseModel):
+    items: List[Task]
+    next_cursor: Optional[str] = None
+
+class TaskSummaryPage(BaseModel):
+    items: List[TaskSummary]
+    next_cursor: Optional[str] = None
+
+class TaskBatchItem(TaskUpdate):
+    id: int
+
+class TaskBatchUpdate(BaseModel):
+    tasks: List[TaskBatchItem]
+
+class TaskBatchDelete(BaseModel):
+    ids: List[int]
+
+class TaskBatchUpdateResult(BaseModel):
+    updated: int
+    tasks: List[TaskSummary]
+
+class TaskBatchDeleteResult(BaseModel):
+    deleted: int
+    ids: List[int]
+
+class TaskImportError(BaseModel):
+    row: int
+    errors: List[str]
+
+class TaskImportResult(BaseModel):
+    imported: int
+    failed: int
+    errors: List[TaskImportError] = []
+
 class DailyStat(BaseModel):
     date: str
     count: int
@@ -0,0 +1,167 @@
+"""
+Full-text search over task titles, descriptions and comment content.
+
+SQLite uses an FTS5 table (tasks_fts) and Postgres a tsvector side table (task_search)
+with a GIN index. In both cases database triggers on tasks and comments keep the index
+in sync, so every write path (ORM, bulk inserts, raw SQL) is covered. setup() is
+idempotent and backfills the index the first time it is created.
+"""
+import re
+
+from sqlalchemy import Float, Integer, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+# dialect name -> whether the full-text index is available on that backend
+_available = {}
+
+SQLITE_REFRESH = """
+    DELETE FROM tasks_fts WHERE rowid = {task_id};
+    INSERT INTO tasks_fts (rowid, title, description, comments, owner_id)
+    SELECT t.id, t.title, t.description,
+           (SELECT group_concat(c.content, ' ') FROM comments c WHERE c.task_id = t.id),
+           t.owner_id
+    FROM tasks t WHERE t.id = {task_id};
+"""
+
+SQLITE_SETUP = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5("
+    "title, description, comments, owner_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN"
+    + SQLITE_REFRESH.format(task_id="NEW.id") + "END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF title, description, owner_id ON tasks BEGIN"
+    + SQLITE_REFRESH.format(task_id="NEW.id") + "END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN "
+    "DELETE FROM tasks_fts WHERE rowid = OLD.id; END",
+    "CREATE TRIGGER IF NOT EXISTS comments_fts_insert AFTER INSERT ON comments BEGIN"
+    + SQLITE_REFRESH.format(task_id="NEW.task_id") + "END",
+    "CREATE TRIGGER IF NOT EXISTS comments_fts_update AFTER UPDATE ON comments BEGIN"
+    + SQLITE_REFRESH.format(task_id="OLD.task_id") + SQLITE_REFRESH.format(task_id="NEW.task_id") + "END",
+    "CREATE TRIGGER IF NOT EXISTS comments_fts_delete AFTER DELETE ON comments BEGIN"
+    + SQLITE_REFRESH.format(task_id="OLD.task_id") + "END",
+]
+
+SQLITE_BACKFILL = """
+    INSERT INTO tasks_fts (rowid, title, description, comments, owner_id)
+    SELECT t.id, t.title, t.description,
+           (SELECT group_concat(c.content, ' ') FROM comments c WHERE c.task_id = t.id),
+           t.owner_id
+    FROM tasks t
+"""
+
+POSTGRES_DOCUMENT = """
+    setweight(to_tsvector('simple', coalesce(t.title, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(t.description, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce(
+        (SELECT string_agg(c.content, ' ') FROM comments c WHERE c.task_id = t.id), '')), 'C')
+"""
+
+POSTGRES_SETUP = [
+    "CREATE TABLE IF NOT EXISTS task_search ("
+    "task_id INTEGER PRIMARY KEY REFERENCES tasks(id) ON DELETE CASCADE, "
+    "owner_id INTEGER NOT NULL, document TSVECTOR NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_task_search_document ON task_search USING GIN (document)",
+    "CREATE INDEX IF NOT EXISTS ix_task_search_owner ON task_search (owner_id)",
+    """
+    CREATE OR REPLACE FUNCTION task_search_refresh(p_task_id INTEGER) RETURNS void AS $$
+    BEGIN
+        DELETE FROM task_search WHERE task_id = p_task_id;
+        INSERT INTO task_search (task_id, owner_id, document)
+        SELECT t.id, t.owner_id, """ + POSTGRES_DOCUMENT + """
+        FROM tasks t WHERE t.id = p_task_id;
+    END $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION tasks_search_sync() RETURNS trigger AS $$
+    BEGIN
+        PERFORM task_search_refresh(NEW.id);
+        RETURN NEW;
+    END $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION comments_search_sync() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' THEN
+            PERFORM task_search_refresh(OLD.task_id);
+        END IF;
+        IF TG_OP <> 'DELETE' THEN
+            PERFORM task_search_refresh(NEW.task_id);
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS tasks_search_sync ON tasks",
+    "CREATE TRIGGER tasks_search_sync AFTER INSERT OR UPDATE OF title, description, owner_id ON tasks "
+    "FOR EACH ROW EXECUTE FUNCTION tasks_search_sync()",
+    "DROP TRIGGER IF EXISTS comments_search_sync ON comments",
+    "CREATE TRIGGER comments_search_sync AFTER INSERT OR UPDATE OR DELETE ON comments "
+    "FOR EACH ROW EXECUTE FUNCTION comments_search_sync()",
+]
+
+POSTGRES_BACKFILL = """
+    INSERT INTO task_search (task_id, owner_id, document)
+    SELECT t.id, t.owner_id, """ + POSTGRES_DOCUMENT + """
+    FROM tasks t
+    ON CONFLICT (task_id) DO NOTHING
+"""
+
+
+def setup(engine: Engine) -> bool:
+    """Create the full-text index and its triggers; returns False if the backend lacks support."""
+    dialect = engine.dialect.name
+    try:
+        with engine.begin() as conn:
+            if dialect == "sqlite":
+                existed = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tasks_fts'"
+                )).first() is not None
+                for statement in SQLITE_SETUP:
+                    conn.exec_driver_sql(statement)
+                if not existed:
+                    conn.exec_driver_sql(SQLITE_BACKFILL)
+            elif dialect == "postgresql":
+                for statement in POSTGRES_SETUP:
+                    conn.exec_driver_sql(statement)
+                if conn.execute(text("SELECT 1 FROM task_search LIMIT 1")).first() is None:
+                    conn.exec_driver_sql(POSTGRES_BACKFILL)
+            else:
+                return False
+    except Exception as e:
+        print(f"[SEARCH] Full-text search unavailable, falling back to LIKE: {e}")
+        _available[dialect] = False
+        return False
+    _available[dialect] = True
+    return True
+
+
+def _terms(term: str):
+    return re.findall(r"\w+", term, flags=re.UNICODE)
+
+
+def ranked_matches(db: Session, user_id: int, term: str):
+    """
+    Subquery of (task_id, rank) for the user's tasks matching every word of `term`
+    as a prefix; lower rank is a better match. Returns None when no full-text index
+    is available or `term` has no words, so the caller can fall back to LIKE.
+    """
+    dialect = db.get_bind().dialect.name
+    if not _available.get(dialect):
+        return None
+    terms = _terms(term)
+    if not terms:
+        return None
+    if dialect == "sqlite":
+        # title hits weigh more than description hits, which weigh more than comments.
+        # owner_id is UNINDEXED in FTS5, so the owner is checked on tasks by primary key
+        query = text(
+            "SELECT f.rowid AS task_id, bm25(tasks_fts, 10.0, 5.0, 1.0) AS rank "
+            "FROM tasks_fts f JOIN tasks t ON t.id = f.rowid "
+            "WHERE tasks_fts MATCH :query AND t.owner_id = :owner_id"
+        ).bindparams(query=" ".join(f'"{t}"*' for t in terms), owner_id=user_id)
+    else:
+        query = text(
+            "SELECT task_id, -ts_rank(document, q) AS rank "
+            "FROM task_search, to_tsquery('simple', :query) q "
+            "WHERE owner_id = :owner_id AND document @@ q"
+        ).bindparams(query=" & ".join(f"{t}:*" for t in terms), owner_id=user_id)
+    return query.columns(task_id=Integer, rank=Float).subquery("search_matches")
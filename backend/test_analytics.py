@@ -0,0 +1,179 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import cache, crud, models, rollups, schemas
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def user(db):
+    db_user = models.User(email="stats@example.com", hashed_password="x", full_name="Stats User")
+    db.add(db_user)
+    db.commit()
+    return db_user
+
+
+def _create(db, user, days_ago=0, **fields):
+    task = crud.create_task(db, schemas.TaskCreate(title="t", **fields), user_id=user.id)
+    if days_ago:
+        # Backdate directly so the streak row is derived from the scan, as for existing data
+        task.created_at = datetime.utcnow() - timedelta(days=days_ago)
+        db.query(models.UserActivityStreak).delete()
+        db.commit()
+    return task
+
+
+def test_stats_totals_and_breakdowns(db, user):
+    _create(db, user, status=models.TaskStatus.DONE, priority=models.TaskPriority.HIGH, time_spent=2.0)
+    _create(db, user, status=models.TaskStatus.DONE, priority=models.TaskPriority.LOW, time_spent=4.0)
+    _create(db, user, status=models.TaskStatus.IN_PROGRESS)
+
+    stats = crud.get_task_stats(db, user_id=user.id, period="week")
+
+    assert stats["total_tasks"] == 3
+    assert stats["completed_tasks"] == 2
+    assert stats["pending_tasks"] == 1
+    assert stats["high_priority_tasks"] == 1
+    assert stats["avg_completion_time"] == 3.0
+    assert [b["value"] for b in stats["status_breakdown"]] == [0, 1, 2]
+    assert [b["value"] for b in stats["priority_breakdown"]] == [1, 1, 1]
+    assert stats["daily_activity"][-1]["count"] == 3
+    assert len(crud.get_task_stats(db, user_id=user.id, period="month")["daily_activity"]) == 30
+    assert len(crud.get_task_stats(db, user_id=user.id, period="day")["daily_activity"]) == 24
+
+
+def test_stats_take_a_fixed_number_of_statements(db, user):
+    other = models.User(email="other@example.com", hashed_password="x", full_name="Other")
+    db.add(other)
+    db.commit()
+    for i in range(20):
+        _create(db, user, status=models.TaskStatus.DONE, time_spent=float(i % 2))
+        _create(db, other, status=models.TaskStatus.DONE, time_spent=5.0)
+
+    user_id = user.id
+    statements = []
+    record = lambda *args: statements.append(args[2])
+    event.listen(db.get_bind(), "before_cursor_execute", record)
+    try:
+        for period in ("day", "week", "month"):
+            statements.clear()
+            stats = crud.get_task_stats(db, user_id=user_id, period=period)
+            # totals and breakdowns, the stored streak, the activity rollups
+            assert len(statements) == 3, period
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", record)
+
+    assert stats["total_tasks"] == stats["completed_tasks"] == 20
+    # done tasks without time spent don't pull the average down
+    assert stats["avg_completion_time"] == 1.0
+
+
+def test_streak_is_scanned_then_maintained_on_writes(db, user):
+    _create(db, user, days_ago=2)
+    _create(db, user, days_ago=1)
+    assert crud.get_current_streak(db, user.id, datetime.utcnow().date()) == 0
+
+    task = _create(db, user)
+    assert db.get(models.UserActivityStreak, user.id).streak == 3
+    assert crud.get_task_stats(db, user_id=user.id)["current_streak"] == 3
+
+    crud.delete_task(db, task.id)
+    assert db.get(models.UserActivityStreak, user.id).streak == 2
+    assert crud.get_task_stats(db, user_id=user.id)["current_streak"] == 0
+
+
+def test_streak_is_extended_from_the_stored_row_not_a_stale_read(db, user):
+    _create(db, user, days_ago=1)
+    _create(db, user)
+    today = datetime.utcnow().date()
+    stale = db.get(models.UserActivityStreak, user.id)
+    assert (stale.streak, stale.last_active_date) == (2, today)
+
+    # Another request records tomorrow's task after this session read the row
+    with sessionmaker(bind=db.get_bind())() as other:
+        crud.record_activity(other, user.id, today + timedelta(days=1))
+        other.commit()
+    crud.record_activity(db, user.id, today + timedelta(days=2))
+    db.commit()
+
+    row = db.get(models.UserActivityStreak, user.id)
+    assert (row.streak, row.last_active_date) == (4, today + timedelta(days=2))
+
+
+def _buckets(db, user):
+    columns = rollups.COUNTER_COLUMNS
+    rows = db.query(models.TaskDailyRollup).filter(models.TaskDailyRollup.user_id == user.id).all()
+    return {(row.day, row.hour): tuple(getattr(row, column) for column in columns) for row in rows}
+
+
+def test_rollups_follow_writes_and_match_backfill(db, user):
+    first = _create(db, user, priority=models.TaskPriority.HIGH, time_spent=1.5)
+    second = _create(db, user)
+    crud.update_task(db, first.id, schemas.TaskUpdate(status=models.TaskStatus.DONE, time_spent=3.0))
+    crud.delete_task(db, second.id)
+
+    (bucket,) = _buckets(db, user).values()
+    assert bucket == (1, 0, 0, 1, 0, 0, 1, 3.0)
+
+    incremental = _buckets(db, user)
+    rollups.backfill(db, user_id=user.id)
+    db.commit()
+    assert _buckets(db, user) == incremental
+
+
+def test_analytics_cache_lru_and_invalidation():
+    backend = cache.MemoryCacheBackend(max_entries=2, ttl=60)
+    backend.set("a", 1)
+    backend.set("b", 2)
+    backend.get("a")
+    backend.set("c", 3)
+    assert backend.get("b") is cache.MISSING
+    assert backend.stats()["evictions"] == 1
+
+    # An invalidation racing with a recompute must not let the stale value be stored
+    def compute():
+        backend.delete("stats")
+        return "stale"
+    assert backend.get_or_set("stats", compute) == "stale"
+    assert backend.get("stats") is cache.MISSING
+
+
+@pytest.fixture
+def redis_backend(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    monkeypatch.setattr(cache.redis.Redis, "from_url", lambda url: fakeredis.FakeRedis())
+    return cache.RedisCacheBackend("redis://cache", ttl=60)
+
+
+def test_redis_cache_keeps_sub_second_ttls(redis_backend):
+    redis_backend.set("short", 1, ttl=0.25)
+    assert redis_backend.get("short") == 1
+    assert 0 < redis_backend.client.pttl("taskflow:short") <= 250
+
+
+def test_redis_cache_drops_values_invalidated_while_computing(redis_backend):
+    def compute():
+        # Another worker invalidates while this one is still computing
+        redis_backend.delete("stats")
+        return "stale"
+    assert redis_backend.get_or_set("stats", compute) == "stale"
+    assert redis_backend.get("stats") is cache.MISSING
+
+    # Values computed after the invalidation are stored
+    redis_backend.CLOCK_SKEW = 0
+    time.sleep(0.01)
+    redis_backend.set("stats", "fresh", computed_since=time.monotonic())
+    assert redis_backend.get("stats") == "fresh" and redis_backend.size() == 1
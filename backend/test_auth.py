@@ -0,0 +1,90 @@
+import asyncio
+
+from sqlalchemy import event
+
+import auth, models
+
+
+def _user_queries(db_session, client, path="/users/me/"):
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db_session.get_bind(), "before_cursor_execute", listener)
+    try:
+        response = client.get(path)
+    finally:
+        event.remove(db_session.get_bind(), "before_cursor_execute", listener)
+    return response, [sql for sql in statements if "FROM users" in sql]
+
+
+def test_current_user_is_cached_per_token(client, db_session, user):
+    response, queries = _user_queries(db_session, client)
+    assert response.json()["email"] == user.email and len(queries) == 1
+
+    response, queries = _user_queries(db_session, client)
+    assert response.status_code == 200 and queries == []
+    assert auth.user_cache.stats()["hits"] >= 2
+
+
+def test_profile_changes_invalidate_the_cached_user(client, db_session, user):
+    client.get("/users/me/")
+    client.put("/users/me/", json={"full_name": "Renamed"})
+    assert client.get("/users/me/").json()["full_name"] == "Renamed"
+
+    # Deactivated outside the API: rejected once the snapshot is invalidated
+    db_session.query(models.User).filter(models.User.id == user.id).update({"is_active": False})
+    db_session.commit()
+    auth.invalidate_user(user.id)
+    assert client.get("/users/me/").status_code == 401
+
+
+def test_token_for_an_old_email_stops_working_after_an_email_change(client, user):
+    client.get("/users/me/")
+    client.put("/users/me/", json={"email": "renamed@example.com"})
+    assert client.get("/users/me/").status_code == 401
+
+
+def test_login_hashes_on_the_pool_and_sheds_load_when_full(client, db_session, user, monkeypatch):
+    user.hashed_password = auth.get_password_hash("secret")
+    db_session.commit()
+    form = {"username": user.email, "password": "secret"}
+
+    assert client.post("/token", data=form).json()["token_type"] == "bearer"
+    assert client.post("/token", data={**form, "password": "wrong"}).status_code == 401
+
+    monkeypatch.setattr(auth, "PASSWORD_HASH_QUEUE_LIMIT", 0)
+    response = client.post("/token", data=form)
+    assert response.status_code == 503 and response.headers["retry-after"] == "1"
+    assert auth.password_hash_stats()["rejected"] >= 1
+
+
+def test_password_reset_flow(client, user):
+    otp = client.post("/auth/forgot-password", json={"email": user.email}).json()["dev_otp"]
+    assert client.post("/auth/reset-password", json={"email": user.email, "otp": "000000", "new_password": "new"}).status_code == 400
+    assert client.post("/auth/reset-password", json={"email": user.email, "otp": otp, "new_password": "new"}).status_code == 200
+    assert client.post("/token", data={"username": user.email, "password": "new"}).status_code == 200
+
+
+
+def test_user_lookup_runs_off_the_event_loop(client, monkeypatch):
+    loops = []
+    resolve_user = auth.resolve_user
+
+    def recording_resolve_user(db, token):
+        loops.append(asyncio._get_running_loop())
+        return resolve_user(db, token)
+
+    monkeypatch.setattr(auth, "resolve_user", recording_resolve_user)
+    # An async route: its dependencies still resolve the user in the threadpool
+    assert client.post("/tasks/", json={"title": "Off the loop"}).status_code == 200
+    assert loops == [None]
+
+
+def test_metrics_need_the_metrics_token(client, monkeypatch):
+    import main
+    assert client.get("/metrics").status_code == 404
+
+    monkeypatch.setattr(main, "METRICS_TOKEN", "scrape-secret")
+    # A user's token is not enough
+    assert client.get("/metrics").status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert response.status_code == 200 and "auth_cache" in response.json()
@@ -0,0 +1,169 @@
+import asyncio
+import sys
+import threading
+
+import pytest
+from sqlalchemy import create_engine, exc, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import auth, database, models, pooling
+from main import app
+
+
+def test_sqlite_production_profile_applies_pragmas(tmp_path):
+    engine = database.create_sqlite_engine(f"sqlite:///{tmp_path / 'tuned.db'}", mode="production")
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == database.SQLITE_BUSY_TIMEOUT_MS
+    engine.dispose()
+
+    engine = database.create_sqlite_engine(f"sqlite:///{tmp_path / 'plain.db'}", mode="default")
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "delete"
+    engine.dispose()
+
+
+def test_writes_wait_for_the_current_writer(tmp_path):
+    engine = database.create_sqlite_engine(f"sqlite:///{tmp_path / 'writes.db'}", mode="production")
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autoflush=False, bind=engine)
+    serializer = database.WriteSerializer(timeout=5)
+    serializer.install(Session)
+
+    first = Session()
+    first.add(models.User(email="first@example.com", hashed_password="x"))
+    first.flush()
+    assert serializer.stats()["held"]
+
+    def second_writer():
+        with Session() as second:
+            second.add(models.User(email="second@example.com", hashed_password="x"))
+            second.commit()
+
+    thread = threading.Thread(target=second_writer)
+    thread.start()
+    thread.join(0.2)
+    assert thread.is_alive() and serializer.waits == 1
+
+    first.commit()
+    thread.join(5)
+    first.close()
+    with Session() as db:
+        assert db.query(models.User).count() == 2
+    assert serializer.stats() == {"waits": 1, "timeouts": 0, "held": False}
+    engine.dispose()
+
+
+def test_async_writes_queue_behind_sync_writes_without_blocking_the_loop(tmp_path):
+    path = tmp_path / "async_writes.db"
+    engine = database.create_sqlite_engine(f"sqlite:///{path}", mode="production")
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autoflush=False, bind=engine)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    AsyncSession = async_sessionmaker(bind=async_engine, autoflush=False)
+    serializer = database.WriteSerializer(timeout=5)
+    serializer.install(Session)
+    serializer.install_async(AsyncSession)
+
+    async def scenario():
+        first = Session()
+        first.add(models.User(email="first@example.com", hashed_password="x"))
+        first.flush()
+
+        async def async_writer():
+            async with AsyncSession() as db:
+                db.add(models.User(email="second@example.com", hashed_password="x"))
+                await db.commit()
+
+        writer = asyncio.create_task(async_writer())
+        # The loop keeps running while the async session waits for the lock
+        for _ in range(200):
+            await asyncio.sleep(0.01)
+            if serializer.waits:
+                break
+        assert serializer.waits == 1 and not writer.done()
+
+        first.commit()
+        first.close()
+        await asyncio.wait_for(writer, 5)
+        await async_engine.dispose()
+
+    asyncio.run(scenario())
+    with Session() as db:
+        assert db.query(models.User).count() == 2
+    assert serializer.stats() == {"waits": 1, "timeouts": 0, "held": False}
+    engine.dispose()
+
+
+def test_missing_async_driver_fails_at_startup(monkeypatch):
+    monkeypatch.setitem(sys.modules, "aiosqlite", None)
+    with pytest.raises(RuntimeError, match="'aiosqlite'"):
+        database._create_async_engine("sqlite:///./startup.db")
+
+
+def test_postgres_engine_args_come_from_settings(monkeypatch):
+    monkeypatch.setattr(pooling, "POOL_SIZE", 3)
+    monkeypatch.setattr(pooling, "STATEMENT_TIMEOUT_MS", 2000)
+    args = pooling.engine_args()
+    assert args["pool_size"] == 3 and args["pool_pre_ping"] is True
+    assert args["connect_args"] == {"options": "-c statement_timeout=2000"}
+    assert pooling.engine_args(asynchronous=True)["connect_args"] == {"server_settings": {"statement_timeout": "2000"}}
+
+    url, kwargs = database._async_engine_args("postgresql://u:p@db/app?sslmode=require")
+    assert url.drivername == "postgresql+asyncpg" and "sslmode" not in url.query
+    assert kwargs["connect_args"]["ssl"] == "require" and kwargs["poolclass"] is pooling.InstrumentedAsyncQueuePool
+
+
+def test_pool_reports_checkouts_overflow_and_timeouts(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=pooling.InstrumentedQueuePool,
+                           pool_size=1, max_overflow=1, pool_timeout=0.05)
+    first, second = engine.connect(), engine.connect()
+    stats = pooling.pool_stats(engine)
+    assert stats["checked_out"] == 2 and stats["overflow"] == 1
+
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+    first.close()
+    second.close()
+    engine.dispose()
+
+    waits = pooling.pool_stats(engine)["checkout_ms"]
+    assert waits["checkouts"] == 3 and waits["timeouts"] == 1
+    assert sum(waits["histogram"].values()) == 3 and waits["max_ms"] >= 50
+
+
+def test_reads_go_to_the_replica_except_right_after_a_write(client, db_session, user, tmp_path):
+    db_session.add(models.Task(id=1, title="Fresh", owner_id=user.id))
+    db_session.commit()
+    # Two SQLite files: the test database as primary, and a "replica" that lags behind it
+    replica_engine = create_engine(f"sqlite:///{tmp_path / 'replica.db'}", connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(bind=replica_engine)
+    Replica = sessionmaker(autoflush=False, bind=replica_engine)
+    with Replica() as replica:
+        replica.add(models.User(id=user.id, email=user.email, hashed_password="x", full_name="Stale"))
+        replica.add(models.Task(id=1, title="Stale", owner_id=user.id))
+        replica.commit()
+    router = database.ReadRouter(primary=sessionmaker(autoflush=False, bind=db_session.get_bind()), replica=Replica, window=60)
+    app.dependency_overrides[database.get_db] = router.get_db
+
+    assert client.get("/tasks/1").json()["title"] == "Stale"
+    assert client.put("/users/me/", json={"full_name": "Fresh"}).json()["full_name"] == "Fresh"
+    # Pinned to the primary: the client sees its own write
+    assert client.get("/tasks/1").json()["title"] == "Fresh"
+
+    router.pins.clear()
+    assert client.get("/tasks/1").json()["title"] == "Stale"
+    assert router.stats() == {"replica": True, "replica_reads": 2, "pinned_reads": 1}
+
+    # Cached values never come from the replica: the user snapshot and the stats are
+    # filled from the primary even though these GETs are not pinned
+    auth.user_cache.clear()
+    assert client.get("/users/me/").json()["full_name"] == "Fresh"
+    assert client.get("/tasks/analytics/").json()["total_tasks"] == 1
+    db_session.query(models.User).filter(models.User.id == user.id).update({"is_active": False})
+    db_session.commit()
+    auth.invalidate_user(user.id)
+    assert client.get("/users/me/").status_code == 401
+    replica_engine.dispose()
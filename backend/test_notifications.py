@@ -0,0 +1,190 @@
+import asyncio
+import contextlib
+import socketserver
+import threading
+from datetime import datetime
+
+import pytest
+
+import crud, database, models, notifications, schemas
+
+
+class SMTPStub(socketserver.ThreadingTCPServer):
+    """Just enough SMTP to accept mail: records connections and received messages."""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, reject=()):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.reject = set(reject)
+        self.connections = 0
+        self.messages = []
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply("220 stub ESMTP")
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode().rstrip("\r\n")
+            command = line[:4].upper()
+            if not line or command == "QUIT":
+                self.reply("221 bye")
+                return
+            if command in ("EHLO", "HELO"):
+                self.reply("250 stub")
+            elif command == "RCPT":
+                address = line.split(":", 1)[1].strip().strip("<>")
+                if address in self.server.reject:
+                    self.reply("550 no such user")
+                else:
+                    recipients.append(address)
+                    self.reply("250 ok")
+            elif command == "DATA":
+                self.reply("354 go ahead")
+                data = []
+                while (chunk := self.rfile.readline()) != b".\r\n":
+                    data.append(chunk.decode())
+                self.server.messages.append((recipients, "".join(data)))
+                recipients = []
+                self.reply("250 queued")
+            elif command == "RSET":
+                recipients = []
+                self.reply("250 ok")
+            else:
+                self.reply("250 ok")
+
+
+@pytest.fixture
+def smtp_server():
+    server = SMTPStub(reject={"bounce@example.com"})
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _outbox(db_session):
+    db_session.expire_all()
+    return {row.recipient: row for row in db_session.query(models.NotificationOutbox).all()}
+
+
+def test_outbox_batches_over_one_connection_and_retries(db_session, smtp_server, monkeypatch):
+    monkeypatch.setattr(notifications, "RETRY_BASE", 0)
+    mailer = notifications.SMTPMailer("127.0.0.1", smtp_server.port, starttls=False)
+    worker = notifications.OutboxWorker(mailer=mailer, max_attempts=2)
+
+    async def scenario():
+        for recipient in ("a@example.com", "b@example.com", "bounce@example.com"):
+            await worker.enqueue(recipient, "Task Updated", f"Hello {recipient}")
+        return await worker.drain()
+
+    assert asyncio.run(scenario()) == 3
+    assert smtp_server.connections == 1 and len(smtp_server.messages) == 2
+    rows = _outbox(db_session)
+    assert rows["a@example.com"].status == "sent" and rows["a@example.com"].sent_at is not None
+    assert rows["bounce@example.com"].status == "pending" and "SMTPRecipientsRefused" in rows["bounce@example.com"].last_error
+
+    # Retried once more, then given up on
+    assert asyncio.run(worker.drain()) == 1
+    assert _outbox(db_session)["bounce@example.com"].status == "failed"
+    assert worker.stats()["sent"] == 2 and worker.stats()["failed"] == 1 and worker.stats()["retried"] == 1
+
+
+def test_unreachable_server_backs_off_and_keeps_the_rows(db_session, smtp_server):
+    port = smtp_server.port
+    smtp_server.shutdown()
+    smtp_server.server_close()
+    worker = notifications.OutboxWorker(mailer=notifications.SMTPMailer("127.0.0.1", port, starttls=False, timeout=1))
+
+    asyncio.run(worker.enqueue("a@example.com", "Task Updated", "Hello"))
+    asyncio.run(worker.drain())
+    row = _outbox(db_session)["a@example.com"]
+    assert row.status == "pending" and row.attempts == 1 and row.claimed_by is None
+    assert row.next_attempt_at > datetime.utcnow()
+    # Not due yet
+    assert asyncio.run(worker.drain()) == 0
+
+
+def test_task_writes_queue_notifications(client, db_session, user):
+    task = client.post("/tasks/", json={"title": "Write report"}).json()
+    client.put(f"/tasks/{task['id']}", json={"status": "done"})
+    subjects = [row.subject for row in db_session.query(models.NotificationOutbox).order_by(models.NotificationOutbox.id)]
+    assert subjects == ["New Task Created", "Task Updated"]
+
+
+def test_notifications_commit_with_the_task_write(db_session, user):
+    notification = notifications.Notification(user.email, "Task Updated", "Hello")
+
+    async def scenario():
+        async with database.AsyncSessionLocal() as db:
+            # No such task: nothing is written, so nothing is queued either
+            assert await crud.update_task_async(db, 999, schemas.TaskUpdate(title="x"), notification=notification) is None
+            await db.commit()
+        async with database.AsyncSessionLocal() as db:
+            await crud.create_task_async(db, schemas.TaskCreate(title="Write report"), user.id, notification=notification)
+
+    asyncio.run(scenario())
+    assert db_session.query(models.NotificationOutbox).count() == 1
+    assert db_session.query(models.Task).count() == 1
+
+
+def test_drain_holds_no_session_while_sending(db_session):
+    open_sessions, open_during_send = [], []
+
+    @contextlib.asynccontextmanager
+    async def tracked_session():
+        open_sessions.append(None)
+        try:
+            async with database.AsyncSessionLocal() as db:
+                yield db
+        finally:
+            open_sessions.pop()
+
+    class RecordingMailer:
+        def send_batch(self, messages):
+            open_during_send.append(len(open_sessions))
+            return [None] * len(messages)
+
+    worker = notifications.OutboxWorker(mailer=RecordingMailer(), session_factory=tracked_session)
+    asyncio.run(worker.enqueue("a@example.com", "Task Updated", "Hello"))
+    assert asyncio.run(worker.drain()) == 1
+    assert open_during_send == [0]
+    row = _outbox(db_session)["a@example.com"]
+    assert row.status == "sent" and row.claimed_by is None
+
+
+def test_digest_collapses_a_burst_for_one_recipient(db_session, smtp_server):
+    mailer = notifications.SMTPMailer("127.0.0.1", smtp_server.port, starttls=False)
+    worker = notifications.OutboxWorker(mailer=mailer, digest_window=60)
+
+    async def burst():
+        for i in range(3):
+            await worker.enqueue("a@example.com", "Task Updated", f"Card {i} moved")
+        await worker.enqueue("b@example.com", "New Task Created", "Card 9 added")
+
+    asyncio.run(burst())
+    # Nothing is due until the window has passed...
+    assert asyncio.run(worker.drain()) == 0
+    # ...and once the first one is, the rest of that recipient's burst goes with it
+    first = db_session.query(models.NotificationOutbox).order_by(models.NotificationOutbox.id).first()
+    first.next_attempt_at = datetime.utcnow()
+    db_session.commit()
+
+    assert asyncio.run(worker.drain()) == 3
+    assert smtp_server.connections == 1 and len(smtp_server.messages) == 1
+    recipients, data = smtp_server.messages[0]
+    assert recipients == ["a@example.com"] and "Subject: 3 task notifications" in data
+    assert all(f"Card {i} moved" in data for i in range(3))
+    assert worker.stats()["digests"] == 1 and worker.stats()["collapsed"] == 2
+    assert _outbox(db_session)["b@example.com"].status == "pending"
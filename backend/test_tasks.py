@@ -0,0 +1,283 @@
+import csv
+import gzip
+import io
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, insert
+from sqlalchemy.orm import sessionmaker
+
+import auth, bulk_import, crud, exports, models, schemas
+
+
+def _seed(db_session, user, count=12):
+    now = datetime.utcnow()
+    priorities = list(models.TaskPriority)
+    for i in range(count):
+        db_session.add(models.Task(
+            title=f"Task {i}",
+            owner_id=user.id,
+            priority=priorities[i % 3],
+            due_date=now + timedelta(days=i % 4) if i % 5 else None,
+            created_at=now - timedelta(minutes=i // 2),
+        ))
+    db_session.commit()
+
+
+def _walk(client, sort, limit=5):
+    ids, cursor = [], ""
+    while cursor is not None:
+        page = client.get("/tasks/", params={"sort": sort, "cursor": cursor, "limit": limit}).json()
+        assert len(page["items"]) <= limit
+        ids.extend(task["id"] for task in page["items"])
+        cursor = page["next_cursor"]
+    return ids
+
+
+@pytest.mark.parametrize("sort", ["created_at", "due_date", "priority"])
+def test_cursor_pages_match_offset_order(client, db_session, user, sort):
+    _seed(db_session, user)
+    offset_ids = [task["id"] for task in client.get("/tasks/", params={"sort": sort}).json()]
+
+    assert len(offset_ids) == 12
+    assert _walk(client, sort) == offset_ids
+
+
+def test_cursor_pages_include_tasks_with_cleared_priority(client, db_session, user):
+    _seed(db_session, user)
+    cleared = [task.id for task in db_session.query(models.Task).order_by(models.Task.id).limit(2)]
+    for task_id in cleared:
+        assert client.put(f"/tasks/{task_id}", json={"priority": None}).json()["priority"] is None
+    offset_ids = [task["id"] for task in client.get("/tasks/", params={"sort": "priority"}).json()]
+
+    assert len(offset_ids) == 12
+    assert offset_ids[-2:] == cleared
+    assert _walk(client, "priority") == offset_ids
+
+
+def test_cursor_is_stable_while_tasks_are_created(client, db_session, user):
+    _seed(db_session, user)
+    first = client.get("/tasks/", params={"cursor": "", "limit": 6}).json()
+    client.post("/tasks/", json={"title": "Brand new"})
+    second = client.get("/tasks/", params={"cursor": first["next_cursor"], "limit": 6}).json()
+
+    seen = [task["id"] for task in first["items"] + second["items"]]
+    assert len(set(seen)) == 12
+
+
+def test_invalid_cursor_is_rejected(client, user):
+    assert client.get("/tasks/", params={"cursor": "not-a-cursor"}).status_code == 400
+    assert client.get("/tasks/", params={"sort": "title"}).status_code == 400
+
+
+@pytest.mark.parametrize("limit", [0, -1])
+def test_out_of_range_limits_are_rejected(client, db_session, user, limit):
+    _seed(db_session, user)
+    assert client.get("/tasks/", params={"cursor": "", "limit": limit}).status_code == 422
+    assert client.get("/tasks/", params={"limit": limit}).status_code == 422
+    # Called directly, a non-positive limit gives an empty page rather than an IndexError
+    assert crud.get_task_page(db_session, user.id, limit=limit) == ([], None)
+
+
+def test_search_is_ranked_and_covers_comments(client, db_session, user):
+    in_comment = client.post("/tasks/", json={"title": "Quarterly report", "description": "numbers"}).json()
+    client.post(f"/tasks/{in_comment['id']}/comments/", json={"content": "waiting on the invoice"})
+    in_title = client.post("/tasks/", json={"title": "Invoice customers"}).json()
+    client.post("/tasks/", json={"title": "Unrelated"})
+    other = models.User(email="other@example.com", hashed_password="x")
+    db_session.add(other)
+    db_session.commit()
+    db_session.add(models.Task(title="Invoice someone else", owner_id=other.id))
+    db_session.commit()
+
+    found = [task["id"] for task in client.get("/tasks/", params={"search": "invoic"}).json()]
+    assert found == [in_title["id"], in_comment["id"]]
+
+    client.put(f"/tasks/{in_title['id']}", json={"title": "Pay suppliers"})
+    client.delete(f"/tasks/{in_comment['id']}")
+    assert client.get("/tasks/", params={"search": "invoice"}).json() == []
+
+
+def _statements_per_request(client, db_session, params):
+    auth.user_cache.clear()
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db_session.get_bind(), "before_cursor_execute", listener)
+    try:
+        assert client.get("/tasks/", params=params).status_code == 200
+    finally:
+        event.remove(db_session.get_bind(), "before_cursor_execute", listener)
+    return len(statements)
+
+
+def _add_task_with_children(db_session, user, n):
+    task = models.Task(title=f"Task {n}", owner_id=user.id)
+    task.comments = [models.Comment(content=f"comment {i}", author_id=user.id) for i in range(3)]
+    task.attachments = [models.Attachment(filename="a.txt", file_path="uploads/a.txt")]
+    db_session.add(task)
+    db_session.commit()
+
+
+@pytest.mark.parametrize("params", [{}, {"view": "summary"}, {"cursor": ""}, {"cursor": "", "view": "summary"}])
+def test_list_issues_constant_number_of_statements(client, db_session, user, params):
+    _add_task_with_children(db_session, user, 0)
+    with_one = _statements_per_request(client, db_session, params)
+    for n in range(1, 20):
+        _add_task_with_children(db_session, user, n)
+    assert _statements_per_request(client, db_session, params) == with_one
+
+
+def test_summary_view_has_counts_only(client, db_session, user):
+    _add_task_with_children(db_session, user, 0)
+    (task,) = client.get("/tasks/", params={"view": "summary"}).json()
+    assert task["comment_count"] == 3
+    assert task["attachment_count"] == 1
+    assert "comments" not in task and "owner" not in task
+
+    (full,) = client.get("/tasks/").json()
+    assert len(full["comments"]) == 3 and full["owner"]["id"] == user.id
+
+
+def test_export_streams_every_task(client, db_session, user):
+    db_session.execute(insert(models.Task), [
+        {"title": f"Task {i}", "owner_id": user.id, "status": models.TaskStatus.DONE, "created_at": datetime.utcnow()}
+        for i in range(2500)
+    ])
+    db_session.commit()
+
+    plain = client.get("/tasks/export")
+    rows = list(csv.reader(io.StringIO(plain.text)))
+    assert rows[0][0] == "ID" and len(rows) == 2501
+    assert rows[1][2] == "done"
+
+    compressed = client.get("/tasks/export", params={"gzip": True})
+    assert compressed.headers["content-type"] == "application/gzip"
+    assert gzip.decompress(compressed.content).decode() == plain.text
+
+
+def test_export_ndjson_and_parquet(client, db_session, user):
+    client.post("/tasks/", json={"title": "Typed", "priority": "high", "time_spent": 1.5})
+
+    lines = client.get("/tasks/export", params={"format": "ndjson"}).text.splitlines()
+    assert len(lines) == 1 and '"priority": "high"' in lines[0]
+    assert client.get("/tasks/export", params={"format": "xml"}).status_code == 400
+
+    pyarrow_parquet = pytest.importorskip("pyarrow.parquet")
+    response = client.get("/tasks/export", params={"format": "parquet"})
+    table = pyarrow_parquet.read_table(io.BytesIO(response.content))
+    assert table.num_rows == 1
+    assert str(table.schema.field("time_spent").type) == "double"
+    assert table.column("priority").to_pylist() == ["high"]
+
+
+def test_parquet_export_without_pyarrow(client, user, monkeypatch):
+    monkeypatch.setattr(exports, "parquet_available", lambda: False)
+    response = client.get("/tasks/export", params={"format": "parquet"})
+    assert response.status_code == 501
+    assert "pyarrow" in response.json()["detail"]
+
+
+def test_import_csv_and_ndjson_with_row_errors(client, db_session, user):
+    csv_body = "Title,Status,Priority,Time Spent (hrs),Due Date\nFirst,done,high,2.5,\n,todo,low,,\nThird,todo,urgent,,\n"
+    result = client.post("/tasks/import", content=csv_body, headers={"Content-Type": "text/csv"}).json()
+    assert result["imported"] == 1 and result["failed"] == 2
+    assert [error["row"] for error in result["errors"]] == [2, 3]
+
+    ndjson_body = '{"title": "Fourth", "priority": "low"}\nnot json\n{"title": "Fifth"}\n'
+    result = client.post("/tasks/import", params={"batch_size": 1}, content=ndjson_body,
+                         headers={"Content-Type": "application/x-ndjson"}).json()
+    assert result["imported"] == 2 and result["errors"][0]["row"] == 2
+
+    titles = sorted(task["title"] for task in client.get("/tasks/").json())
+    assert titles == ["Fifth", "First", "Fourth"]
+    stats = client.get("/tasks/analytics/").json()
+    assert stats["total_tasks"] == 3 and stats["daily_activity"][-1]["count"] == 3
+    assert client.get("/tasks/", params={"search": "fourth"}).json()[0]["title"] == "Fourth"
+
+
+def test_batch_update_and_delete(client, db_session, user):
+    ids = [client.post("/tasks/", json={"title": f"Card {i}", "time_spent": 1.0}).json()["id"] for i in range(5)]
+    other = models.User(email="other@example.com", hashed_password="x")
+    db_session.add(other)
+    db_session.commit()
+    foreign = models.Task(title="Not mine", owner_id=other.id)
+    db_session.add(foreign)
+    db_session.commit()
+
+    assert client.patch("/tasks/batch", json={"tasks": [{"id": ids[0], "status": "done"}, {"id": foreign.id, "status": "done"}]}).status_code == 403
+    assert client.patch("/tasks/batch", json={"tasks": [{"id": 10_000, "status": "done"}]}).status_code == 404
+    assert client.get("/tasks/analytics/").json()["completed_tasks"] == 0
+
+    result = client.patch("/tasks/batch", json={"tasks": [{"id": i, "status": "done"} for i in ids[:4]]}).json()
+    assert result["updated"] == 4 and {task["status"] for task in result["tasks"]} == {"done"}
+    assert {task["version"] for task in result["tasks"]} == {2}
+    stats = client.get("/tasks/analytics/").json()
+    assert stats["completed_tasks"] == 4 and stats["pending_tasks"] == 1
+
+    result = client.patch("/tasks/batch", json={"tasks": [{"id": ids[4], "status": None}]}).json()
+    assert result["tasks"][0]["status"] is None
+    client.patch("/tasks/batch", json={"tasks": [{"id": ids[4], "status": "todo"}]})
+
+    result = client.request("DELETE", "/tasks/batch", json={"ids": ids[1:]}).json()
+    assert result == {"deleted": 4, "ids": ids[1:]}
+    assert [task["id"] for task in client.get("/tasks/").json()] == [ids[0]]
+    stats = client.get("/tasks/analytics/").json()
+    assert stats["total_tasks"] == 1 and stats["completed_tasks"] == 1
+    assert stats["daily_activity"][-1]["count"] == 1 and stats["daily_activity"][-1]["hours"] == 1.0
+
+
+def test_single_task_writes_return_loaded_relations(client, db_session, user):
+    created = client.post("/tasks/", json={"title": "Async write"}).json()
+    assert created["owner"]["email"] == user.email and created["comments"] == []
+    client.post(f"/tasks/{created['id']}/comments/", json={"content": "First"})
+
+    updated = client.put(f"/tasks/{created['id']}", json={"status": "done"}).json()
+    assert updated["status"] == "done" and updated["version"] == 2
+    assert updated["comments"][0]["author"]["email"] == user.email
+
+    deleted = client.delete(f"/tasks/{created['id']}").json()
+    assert deleted["comments"][0]["content"] == "First"
+    assert db_session.query(models.Task).count() == 0
+
+
+def test_overlapping_updates_both_apply_and_bump_the_version(db_session, user):
+    db_session.add(models.Task(title="Shared", owner_id=user.id))
+    db_session.commit()
+    task_id = db_session.query(models.Task.id).scalar()
+    Session = sessionmaker(autoflush=False, bind=db_session.get_bind())
+
+    # Both requests load version 1 before either writes
+    first, second = Session(), Session()
+    first_task, second_task = first.get(models.Task, task_id), second.get(models.Task, task_id)
+    crud.update_task(first, task_id, schemas.TaskUpdate(status="done"))
+    crud.update_tasks(second, [second_task], [schemas.TaskBatchItem(id=task_id, title="Renamed")])
+    crud.update_task(first, task_id, schemas.TaskUpdate(status="done"))  # no change, no bump
+    first.close()
+    second.close()
+
+    db_session.expire_all()
+    task = db_session.get(models.Task, task_id)
+    assert (task.title, task.status, task.version) == ("Renamed", models.TaskStatus.DONE, 3)
+
+
+def test_import_stops_at_an_unreadable_row_and_keeps_the_rows_before_it(client, user):
+    body = "title\nFirst\nSecond\n".encode() + "Caf\xe9\n".encode("latin-1") + b"Fourth\n"
+    response = client.post("/tasks/import", params={"batch_size": 1}, content=body, headers={"Content-Type": "text/csv"})
+    assert response.status_code == 400
+    detail = response.json()["detail"]
+    assert detail["row"] == 3 and detail["imported"] == 2 and detail["message"].startswith("Could not read row 3")
+
+    response = client.post("/tasks/import", content='title,description\nFifth,"never closed\n', headers={"Content-Type": "text/csv"})
+    assert response.status_code == 400 and response.json()["detail"]["row"] == 1
+    assert sorted(task["title"] for task in client.get("/tasks/").json()) == ["First", "Second"]
+
+
+def test_import_rejects_bodies_over_the_size_limit(client, user, monkeypatch):
+    monkeypatch.setattr(bulk_import, "MAX_BODY_BYTES", 32)
+    body = "title\n" + "".join(f"Task {i}\n" for i in range(10))
+    response = client.post("/tasks/import", content=body, headers={"Content-Type": "text/csv"})
+    assert response.status_code == 413
+
+    chunks = iter([body[:20].encode(), body[20:].encode()])
+    response = client.post("/tasks/import", content=chunks, headers={"Content-Type": "text/csv"})
+    assert response.status_code == 413 and client.get("/tasks/").json() == []
@@ -1,17 +1,189 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import WebSocketDisconnect
 from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+import auth, backplane, models, realtime
 from main import app
-import pytest
 
-client = TestClient(app)
 
-def test_websocket_connection():
-    with client.websocket_connect("/ws/test_client_id") as websocket:
-        # 1. Connection established
-        # 2. Send a message
-        websocket.send_text("Hello Server")
-        
-        # 3. Receive a message (if our server echoes back, or just check no error on close)
-        # In our implementation, the server doesn't echo back immediately unless broadcasted.
-        # But connection should be successful.
-        assert websocket.scope["root_path"] == ""
+def test_websocket_requires_a_valid_token(db_session, user):
+    client = TestClient(app)
+    for url in ("/ws", "/ws?token=not-a-jwt", "/ws/123"):
+        with pytest.raises(WebSocketDisconnect) as closed:
+            with client.websocket_connect(url) as websocket:
+                websocket.receive_text()
+        assert closed.value.code == 1008
+
+
+def test_websocket_receives_only_its_users_events(db_session, user):
+    token = auth.create_access_token(data={"sub": user.email})
+    other = models.User(email="other@example.com", hashed_password="x", full_name="Other")
+    db_session.add(other)
+    db_session.commit()
+    other_token = auth.create_access_token(data={"sub": other.email})
+
+    with TestClient(app) as client:
+        with client.websocket_connect(f"/ws?token={token}") as websocket:
+            assert websocket.receive_json()["type"] == "CONNECTED"
+            client.post("/tasks/", json={"title": "Theirs"}, headers={"Authorization": f"Bearer {other_token}"})
+            client.post("/tasks/", json={"title": "Mine"}, headers={"Authorization": f"Bearer {token}"})
+            event = websocket.receive_json()
+            assert event["type"] == "TASK_CREATED" and event["task"]["title"] == "Mine"
+            websocket.send_text("pong")
+
+
+class StalledWebSocket:
+    """Accepts the handshake, then never finishes a send."""
+
+    def __init__(self):
+        self.sent = []
+        self.closed_with = None
+        self.release = asyncio.Event()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message):
+        await self.release.wait()
+        self.sent.append(message)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def _events(websocket):
+    return [json.loads(message) for message in websocket.sent]
+
+
+def test_slow_connection_gets_resync_then_is_dropped():
+    async def scenario():
+        manager = realtime.ConnectionManager(queue_size=2)
+        slow, fast = StalledWebSocket(), StalledWebSocket()
+        fast.release.set()
+        await manager.connect(slow, [realtime.user_channel(1)])
+        await manager.connect(fast, [realtime.user_channel(1)])
+        await asyncio.sleep(0)
+
+        for i in range(4):
+            assert manager.publish(realtime.user_channel(1), json.dumps({"n": i})) >= 1
+            await asyncio.sleep(0)
+        assert [event.get("n") for event in _events(fast)] == [None, 0, 1, 2, 3]
+        assert manager.resyncs == 1 and slow in manager.connections
+
+        for i in range(4, 8):
+            manager.publish(realtime.user_channel(1), json.dumps({"n": i}))
+            await asyncio.sleep(0)
+        assert slow not in manager.connections and slow.closed_with == realtime.OVERFLOW_CLOSE_CODE
+        assert len(fast.sent) == 9 and manager.stats()["connections"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_reconnecting_client_is_replayed_missed_events():
+    async def scenario():
+        manager = realtime.ConnectionManager(replay_buffer_size=4)
+        first = StalledWebSocket()
+        first.release.set()
+        await manager.connect(first, [realtime.user_channel(1)])
+        manager.publish(realtime.user_channel(1), json.dumps({"type": "TASK_CREATED", "id": 1}))
+        await asyncio.sleep(0)
+        connected, created = _events(first)
+        manager.disconnect(first)
+
+        manager.publish(realtime.user_channel(2), json.dumps({"type": "TASK_CREATED", "id": 2}))
+        manager.publish(realtime.user_channel(1), json.dumps({"type": "TASK_DELETED", "id": 1}))
+        replayed = StalledWebSocket()
+        replayed.release.set()
+        await manager.connect(replayed, [realtime.user_channel(1)], since=created["seq"], epoch=connected["epoch"])
+
+        for _ in range(5):
+            manager.publish(realtime.user_channel(2), json.dumps({"type": "TASK_CREATED"}))
+        too_late, other_epoch = StalledWebSocket(), StalledWebSocket()
+        too_late.release.set()
+        other_epoch.release.set()
+        await manager.connect(too_late, [realtime.user_channel(1)], since=created["seq"], epoch=connected["epoch"])
+        await manager.connect(other_epoch, [realtime.user_channel(1)], since=manager.log.seq, epoch="restarted")
+        await asyncio.sleep(0)
+        return created, _events(replayed), _events(too_late), _events(other_epoch)
+
+    created, replayed, too_late, other_epoch = asyncio.run(scenario())
+    assert created["seq"] == 1
+    assert [(event["type"], event.get("seq")) for event in replayed] == [("CONNECTED", 3), ("TASK_DELETED", 3)]
+    assert too_late[-1]["type"] == "RESYNC" and too_late[-1]["seq"] == 8
+    assert other_epoch[-1]["type"] == "RESYNC"
+
+
+def test_polling_backplane_relays_between_workers():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(bind=engine)
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        worker_a = backplane.PollingBackplane(engine, origin="worker-a", interval=0.01)
+        worker_b = backplane.PollingBackplane(engine, origin="worker-b", interval=0.01)
+        received_a, received_b = [], []
+        worker_a.start(loop, lambda channel, message: received_a.append((channel, message)))
+        worker_b.start(loop, lambda channel, message: received_b.append((channel, message)))
+        try:
+            await asyncio.sleep(0.05)
+            worker_a.publish("user:1", "created")
+            for _ in range(100):
+                if received_b:
+                    break
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.05)
+        finally:
+            worker_a.stop()
+            worker_b.stop()
+        return received_a, received_b
+
+    received_a, received_b = asyncio.run(scenario())
+    assert received_b == [("user:1", "created")]
+    # The publishing worker already delivered locally and skips its own echo
+    assert received_a == []
+
+
+def test_updates_to_a_task_are_coalesced_in_order():
+    async def scenario():
+        published = []
+        coalescer = realtime.UpdateCoalescer(lambda channel, message: published.append(json.loads(message)), window=0.05)
+        coalescer.update("user:1", 7, 2, {"status": "in_progress"})
+        coalescer.update("user:1", 8, 2, {"title": "Renamed"})
+        coalescer.update("user:1", 7, 3, {"status": "done", "time_spent": 1.5})
+        assert published == []
+        await asyncio.sleep(0.1)
+        coalescer.update("user:1", 7, 4, {"priority": "high"})
+        coalescer.publish("user:1", json.dumps({"type": "TASK_DELETED", "task_id": 7}))
+        return published, coalescer.merged
+
+    published, merged = asyncio.run(scenario())
+    assert merged == 1
+    assert published == [
+        {"type": "TASK_UPDATED", "task_id": 7, "version": 3, "changes": {"status": "done", "time_spent": 1.5}},
+        {"type": "TASK_UPDATED", "task_id": 8, "version": 2, "changes": {"title": "Renamed"}},
+        {"type": "TASK_UPDATED", "task_id": 7, "version": 4, "changes": {"priority": "high"}},
+        {"type": "TASK_DELETED", "task_id": 7},
+    ]
+
+
+def test_heartbeat_pings_live_connections_and_reaps_idle_ones():
+    async def scenario():
+        manager = realtime.ConnectionManager(ping_interval=0, idle_timeout=30)
+        live, idle = StalledWebSocket(), StalledWebSocket()
+        live.release.set()
+        await manager.connect(live, [realtime.user_channel(1)])
+        await manager.connect(idle, [realtime.user_channel(1)])
+        manager.connections[idle].last_seen -= 60
+        manager.heartbeat()
+        await asyncio.sleep(0)
+        return manager, live, idle
 
+    manager, live, idle = asyncio.run(scenario())
+    assert [event["type"] for event in _events(live)] == ["CONNECTED", "PING"]
+    assert idle not in manager.connections and idle.closed_with == realtime.IDLE_CLOSE_CODE
+    assert manager.stats()["reaped"] == 1 and manager.stats()["connections"] == 1
@@ -36,7 +36,7 @@ const ChatBot = () => {
     // Fetch tasks from API
     const fetchTasks = useCallback(async () => {
         try {
-            const res = await api.get('/tasks/');
+            const res = await api.get('/tasks/?view=summary');
             setTasks(res.data);
             return res.data as Task[];
         } catch (err) {
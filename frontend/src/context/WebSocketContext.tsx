@@ -1,4 +1,5 @@
 import React, { createContext, useContext, useEffect, useRef } from 'react';
+import { useAuth } from './AuthContext';
 
 type WebSocketContextType = {
     socket: WebSocket | null;
@@ -7,41 +8,88 @@ type WebSocketContextType = {
 
 const WebSocketContext = createContext<WebSocketContextType>({ socket: null, lastMessage: null });
 
+const MAX_RECONNECT_DELAY = 30000;
+
 export const WebSocketProvider: React.FC<{ children: React.ReactNode }> = ({ children }) => {
     const socket = useRef<WebSocket | null>(null);
     const [lastMessage, setLastMessage] = React.useState<any>(null);
+    const { user } = useAuth();
+    const userId = user?.id;
+    // Position in the server's event stream, sent on reconnect so only missed events are replayed
+    const position = useRef<{ epoch: string | null; seq: number | null }>({ epoch: null, seq: null });
 
     useEffect(() => {
-        // Simple random ID for client differentiation in this demo
-        const clientId = Math.floor(Math.random() * 1000);
+        const token = localStorage.getItem('token');
+        if (!userId || !token) return;
         // Determine WS URL from API URL
         const apiBase = import.meta.env.VITE_API_URL || 'http://localhost:8000';
         const wsBase = apiBase.replace(/^http/, 'ws');
-        const ws = new WebSocket(`${wsBase}/ws/${clientId}`);
-
-        ws.onopen = () => {
-            console.log('Connected to WebSocket');
-        };
+        let closed = false;
+        let attempts = 0;
+        let reconnectTimer: ReturnType<typeof setTimeout> | undefined;
 
-        ws.onmessage = (event) => {
-            try {
-                const data = JSON.parse(event.data);
-                setLastMessage(data);
-            } catch (e) {
-                console.error("Failed to parse WebSocket message", e);
+        const connect = () => {
+            const { epoch, seq } = position.current;
+            // The server authenticates the handshake with the JWT and subscribes us to our own events
+            const params = new URLSearchParams({ token });
+            if (epoch && seq !== null) {
+                params.set('since', String(seq));
+                params.set('epoch', epoch);
             }
-        };
+            const ws = new WebSocket(`${wsBase}/ws?${params}`);
+
+            ws.onopen = () => {
+                attempts = 0;
+                console.log('Connected to WebSocket');
+            };
+
+            ws.onmessage = (event) => {
+                try {
+                    const data = JSON.parse(event.data);
+                    if (data.type === 'PING') {
+                        // Heartbeat: the server drops connections that stop answering
+                        ws.send('pong');
+                        return;
+                    }
+                    if (data.type === 'CONNECTED') {
+                        // A first connection starts from here; a reconnect keeps its own position
+                        // and gets the missed events (or a RESYNC) right after this message.
+                        if (position.current.epoch !== data.epoch) {
+                            position.current = { epoch: data.epoch, seq: data.seq };
+                        }
+                        return;
+                    }
+                    if (data.seq !== undefined) {
+                        position.current = { epoch: data.epoch ?? position.current.epoch, seq: data.seq };
+                    }
+                    // RESYNC means events were missed: pages refetch on any message
+                    setLastMessage(data);
+                } catch (e) {
+                    console.error("Failed to parse WebSocket message", e);
+                }
+            };
+
+            ws.onclose = (event) => {
+                console.log('Disconnected from WebSocket');
+                // 1008: the token was rejected; reconnecting with it again won't help
+                if (closed || event.code === 1008) return;
+                // Back off with jitter so a restarted server isn't hit by every client at once
+                const delay = Math.min(MAX_RECONNECT_DELAY, 1000 * 2 ** attempts) * (0.5 + Math.random() / 2);
+                attempts += 1;
+                reconnectTimer = setTimeout(connect, delay);
+            };
 
-        ws.onclose = () => {
-            console.log('Disconnected from WebSocket');
+            socket.current = ws;
         };
 
-        socket.current = ws;
+        connect();
 
         return () => {
-            ws.close();
+            closed = true;
+            clearTimeout(reconnectTimer);
+            socket.current?.close();
         };
-    }, []);
+    }, [userId]);
 
     return (
         <WebSocketContext.Provider value={{ socket: socket.current, lastMessage }}>
@@ -122,7 +122,7 @@ const Dashboard = () => {
             const p = selectedPeriod || period;
             const [statsRes, tasksRes] = await Promise.all([
                 api.get(`/tasks/analytics/?period=${p}`),
-                api.get('/tasks/?limit=5')
+                api.get('/tasks/?limit=5&view=summary')
             ]);
             setStats(statsRes.data);
             setRecentTasks(tasksRes.data);
@@ -19,7 +19,7 @@ const TaskList = () => {
 
     const fetchTasks = () => {
         setLoading(true);
-        let query = '?';
+        let query = '?view=summary&';
         if (statusFilter) query += `status=${statusFilter}&`;
         if (search) query += `search=${search}&`;
 
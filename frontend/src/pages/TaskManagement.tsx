@@ -21,7 +21,7 @@ const TaskManagement = () => {
     const fetchTasks = async () => {
         setLoading(true);
         try {
-            const response = await api.get('/tasks/');
+            const response = await api.get('/tasks/?view=summary');
             setTasks(response.data);
         } catch (error) {
             console.error("Failed to fetch tasks", error);
@@ -27,6 +27,11 @@ export interface Task {
     };
     attachments?: any[];
     comments?: any[];
+    // bumped on every update; WebSocket TASK_UPDATED diffs carry the new value
+    version?: number;
+    // present on list responses requested with view=summary
+    comment_count?: number;
+    attachment_count?: number;
 }
 
 export interface TaskCreate {